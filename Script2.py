@@ -1,9 +1,10 @@
 import csv
 import json
-import time
-import requests
 from urllib.parse import urlparse
+from nvd_store import NvdStore
 
+# 先导入 NvdStore 的本地 NVD JSON 文件（API 2.0 格式，可以是 .gz），为空时第一次运行下载全部记录
+nvd_feeds = []
 
 def extract_cwe_repo_commit_urls(json_data):
     try:
@@ -66,16 +67,17 @@ with open('output.csv', 'w', newline='') as csvfile:
 
     # 初始化索引
     index = 0
-    url_prefix = "https://services.nvd.nist.gov/rest/json/cves/2.0?cveId="
+    # 从本地的 NVD 记录库查询：先导入本地文件并下载上次同步之后修改过的记录，库中仍然没有的 CVE 再单独请求
+    store = NvdStore('nvd_cache.sqlite')
+    store.sync(nvd_feeds)
+    store.resolve(data['test'])
 
     # 遍历JSON数据中的CVE ID列表
     for cve_id in data['test']:
         # 索引加一
         index += 1
-        full_url = url_prefix + cve_id
-        response = requests.get(full_url)
-        if response.status_code == 200:
-            json_data = response.json()
+        json_data = store.get_response(cve_id)
+        if json_data is not None:
             # 提取CVE信息
             print(f"JSON data for CVE {cve_id}: {json.dumps(json_data)}")
             cwe_list, repo_commit_urls = extract_cwe_repo_commit_urls(json.dumps(json_data))
@@ -95,5 +97,3 @@ with open('output.csv', 'w', newline='') as csvfile:
                     f'Index: {index}, CVE ID: {cve_id}, CWE: {", ".join(cwe_list)}, GitHub commit URL: {repo_commit_urls[0]["commit_url"]}, Repository: {repo_commit_urls[0]["repo"]}')
             else:
                 print(f'Index: {index}, CVE ID: {cve_id} - No repository found, skipping.')
-        # 休眠2秒
-        time.sleep(2)
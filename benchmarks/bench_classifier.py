@@ -0,0 +1,113 @@
+"""
+diff 行分类的微基准：比较逐个调用正则的旧写法和按文件跟踪注释、字符串状态的 rs.LineLexer 的每秒行数。
+
+用法:
+    python benchmarks/bench_classifier.py [--lines 500000] [diff 文件 ...]
+
+不指定文件时使用 benchmarks/corpus 下的 diff（真实的安全修复提交）。
+rs.parse_stream 不分类测试文件和未启用语言的文件中的行，计时前先去掉这些文件，两种写法处理同样的行。
+旧写法只看行首的 // 、/* 和 *，两者对多行注释中的修改行、字符串里的 "/*" 等的判断不同，另外报告分类不同的修改行数。
+"""
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rs
+import languages
+
+corpus_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+def legacy_classify(line):
+    """旧的 parse_hunk 中的判断方式：每行依次调用未预编译的正则和 any(startswith)。"""
+    if line.startswith('diff'):
+        is_test = bool(re.search("^diff --git.*[Tt][Ee][Ss][Tt].*$", line))
+        is_java = bool(re.search(r"^diff --git.*\.java$", line))
+        return rs.LINE_DIFF, is_test, is_java
+    if line.startswith('@@'):
+        return rs.LINE_HUNK, False, False
+    if line.find('import') != -1:
+        return rs.LINE_IMPORT, False, False
+    if line[:1] == '-' or line[:1] == '+':
+        if any(line.startswith(ignore) for ignore in ['+++', '---']):
+            return rs.LINE_FILE_MARKER, False, False
+        if bool(re.match(r'^\s*$', line[1:])):
+            return rs.LINE_BLANK, False, False
+        if re.match(r'^[+-]?\s*//', line):
+            return rs.LINE_COMMENT, False, False
+        if re.match(r'^[+-]?\s*/\*', line):
+            return rs.LINE_COMMENT, False, False
+        if re.match(r'^[+-]?\s*\*', line):
+            return rs.LINE_IN_COMMENT, False, False
+        return (rs.LINE_ADDED if line[0] == '+' else rs.LINE_REMOVED), False, False
+    return rs.LINE_CONTEXT, False, False
+
+def legacy_classify_lines(lines):
+    return [legacy_classify(line)[0] for line in lines]
+
+def lexer_classify_lines(lines):
+    """新的写法：文件头取一次语言并建立 LineLexer，其余的行由它分类，hunk 头重置状态。"""
+    labels = []
+    lexer = None
+    for line in lines:
+        kind = rs.classify_line(line, lexer)
+        if kind == rs.LINE_DIFF:
+            language = languages.get_language(line)
+            lexer = rs.LineLexer(language) if language is not None and rs.test_file_pattern.search(line) is None else None
+        elif kind == rs.LINE_HUNK and lexer is not None:
+            lexer.start_hunk()
+        labels.append(kind)
+    return labels
+
+def measure(classify_lines, lines, rounds=3):
+    """返回多轮中最快的一轮的每秒行数和分类结果。"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        labels = classify_lines(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best, labels
+
+def source_lines(lines):
+    """只保留启用语言的非测试文件（文件头和其后的行），与 rs.parse_stream 建立 LineLexer 的条件相同。"""
+    selected = []
+    keep = False
+    for line in lines:
+        if line.startswith('diff'):
+            keep = languages.get_language(line) is not None and rs.test_file_pattern.search(line) is None
+        if keep:
+            selected.append(line)
+    return selected
+
+def load_lines(path, total):
+    """读取 diff 中源文件的行并重复到 total 行，减少计时误差；没有源文件时返回空列表。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = source_lines(f.read().splitlines())
+    if not lines:
+        return []
+    return (lines * (total // len(lines) + 1))[:total]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='diff 行分类的微基准')
+    parser.add_argument('--lines', type=int, default=500000, help='每个文件重复到的行数')
+    parser.add_argument('files', nargs='*', help='diff 文件，默认使用 benchmarks/corpus/*.diff')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(corpus_dir, '*.diff')))
+    print(f"{'file':<40}{'before (lines/s)':>18}{'after (lines/s)':>18}{'speedup':>10}{'reclassified':>14}")
+    for path in files:
+        lines = load_lines(path, args.lines)
+        if not lines:
+            print(f"{os.path.basename(path):<40}no source files")
+            continue
+        before, legacy_labels = measure(legacy_classify_lines, lines)
+        after, labels = measure(lexer_classify_lines, lines)
+        # 只比较修改行和注释行，文件头、hunk 头和上下文行两种写法相同
+        reclassified = sum(1 for old, new in zip(legacy_labels, labels)
+                           if new in (rs.LINE_ADDED, rs.LINE_REMOVED, rs.LINE_COMMENT, rs.LINE_IN_COMMENT) and old != new)
+        print(f"{os.path.basename(path):<40}{before:>18,.0f}{after:>18,.0f}{after / before:>9.2f}x{reclassified:>14,}")
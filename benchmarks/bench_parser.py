@@ -0,0 +1,250 @@
+"""
+DiffParser 的基准测试和结果校验。
+
+用法:
+    python benchmarks/bench_parser.py                  # 运行全部语料，与 golden.json 比较
+    python benchmarks/bench_parser.py --skip-vendored  # 不生成 50MB 的大 diff
+    python benchmarks/bench_parser.py --update-golden  # 解析逻辑有意改变后更新 golden.json
+
+语料:
+- corpus/tiny.diff: 手写的小 diff，覆盖注释、import、测试文件和非 Java 文件。
+- corpus/*-CVE-*.diff 等: 真实的安全修复提交。
+- vendored: 运行时按固定随机种子生成的约 50MB 的 diff，模拟一次升级第三方源码的提交。
+
+每个语料在单独的子进程中运行，报告 parse_file、parse_hunk、extract_diff_file_and_lines、
+parse_stream（文本和 bytes 输入）、extract_functions 各自的耗时、parse_stream 的每秒行数和子进程的峰值内存；
+任何一个指标与 golden.json 不同时以状态码 1 退出。
+"""
+import io
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import contextlib
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不报告峰值内存
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+corpus_dir = os.path.join(benchmarks_dir, 'corpus')
+golden_path = os.path.join(benchmarks_dir, 'golden.json')
+
+# 生成的大 diff 的大小（MB）和随机种子，改变后需要更新 golden.json
+vendored_mb = 50
+vendored_seed = 20240101
+
+def generate_vendored_diff(path, size_mb=vendored_mb, seed=vendored_seed):
+    """
+    生成一个模拟升级第三方源码的 diff：大量新增和修改的 Java 文件，夹杂测试文件和资源文件。
+
+    参数:
+    - path: 输出文件路径。
+    - size_mb: 大约的大小（MB）。
+    - seed: 随机种子，相同的参数总是生成相同的内容。
+    """
+    rng = random.Random(seed)
+    limit = size_mb * 1024 * 1024
+    written = 0
+    words = ['value', 'buffer', 'index', 'result', 'node', 'entry', 'count', 'name', 'offset', 'token']
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        number = 0
+        while written < limit:
+            number += 1
+            package = f"vendor/lib{number % 37}/src/main/java/org/vendor/p{number % 11}"
+            kind = rng.random()
+            if kind < 0.08:
+                name = f"{package.replace('main', 'test')}/Class{number}Test.java"
+            elif kind < 0.15:
+                name = f"vendor/lib{number % 37}/resources/messages{number}.properties"
+            else:
+                name = f"{package}/Class{number}.java"
+
+            out = [f"diff --git a/{name} b/{name}"]
+            body = [f"package org.vendor.p{number % 11};", "", "import java.util.List;", "",
+                    f"public class Class{number} {{"]
+            for method in range(rng.randint(3, 12)):
+                word = rng.choice(words)
+                body.append(f"    /** {word} accessor */")
+                body.append(f"    public int {word}{method}(int {word}) {{")
+                for _ in range(rng.randint(2, 8)):
+                    body.append(f"        {word} = {word} * {rng.randint(1, 97)} + {rng.randint(0, 9)}; // step")
+                body.append(f"        return {word};")
+                body.append("    }")
+                body.append("")
+            body.append("}")
+
+            if rng.random() < 0.5:
+                out += ["new file mode 100644", "index 0000000..1111111", "--- /dev/null", f"+++ b/{name}",
+                        f"@@ -0,0 +1,{len(body)} @@"]
+                out += ['+' + line for line in body]
+            else:
+                out += ["index 1111111..2222222 100644", f"--- a/{name}", f"+++ b/{name}"]
+                position = 1
+                while position < len(body) - 4:
+                    start = rng.randint(position, min(len(body) - 4, position + 20))
+                    context = body[start - 1:start + 2]
+                    changed = body[start + 2:start + 4]
+                    out.append(f"@@ -{start},{len(context) + len(changed)} +{start},{len(context) + len(changed)} @@")
+                    out += [' ' + line for line in context]
+                    out += ['-' + line + ' // old' for line in changed]
+                    out += ['+' + line for line in changed]
+                    position = start + 4
+            text = '\n'.join(out) + '\n'
+            f.write(text)
+            written += len(text.encode('utf-8'))
+
+def materialize_post_image(diff_text, root):
+    """
+    根据 diff 的上下文行和新增行在 root 下重建修改后的 Java 文件，供 extract_functions 读取。
+
+    diff 中没有出现的行留空，行号与 hunk 头中的新行号一致，结果只取决于 diff 本身。
+    """
+    files = {}
+    current = None
+    new_line = 0
+    for line in diff_text.splitlines():
+        if line.startswith('diff --git'):
+            current = None
+            path = line.split(' b/', 1)[-1]
+            if path.endswith('.java'):
+                current = files.setdefault(path, {})
+        elif current is None:
+            continue
+        elif line.startswith('@@'):
+            header = line.split('+', 1)[1].split(' ', 1)[0]
+            new_line = int(header.split(',')[0])
+        elif line.startswith('+++') or line.startswith('---'):
+            continue
+        elif line.startswith('+') or line.startswith(' ') or line == '':
+            current[new_line] = line[1:]
+            new_line += 1
+    for path, lines in files.items():
+        full_path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        size = max(lines) if lines else 0
+        with open(full_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write('\n'.join(lines.get(number, '') for number in range(1, size + 1)))
+
+def timed(function, *args):
+    """执行函数并屏蔽它的打印输出，返回 (结果, 秒数)。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = function(*args)
+        return result, time.perf_counter() - start
+
+def run_case(path):
+    """
+    在当前进程中运行一个语料，返回指标、耗时和峰值内存的字典。
+    """
+    import rs
+
+    with open(path, 'rb') as f:
+        diff_bytes = f.read()
+    diff_text = diff_bytes.decode('utf-8')
+    line_count = diff_text.count('\n')
+
+    timings = {}
+    with tempfile.TemporaryDirectory() as root:
+        materialize_post_image(diff_text, root)
+        parser = rs.DiffParser(diff_text, repo=root)
+        (file, java_file, test_in_commit), timings['parse_file'] = timed(parser.parse_file)
+        hunk, timings['parse_hunk'] = timed(parser.parse_hunk)
+        ranges, timings['extract_diff_file_and_lines'] = timed(parser.extract_diff_file_and_lines)
+        metrics, timings['parse_stream'] = timed(rs.DiffParser(repo=root).parse_stream, diff_text.splitlines())
+        byte_metrics, timings['parse_stream (bytes)'] = timed(rs.DiffParser(repo=root).parse_stream, diff_bytes)
+        functions, timings['extract_functions'] = timed(parser.extract_functions, metrics.files_and_ranges)
+
+    result = {
+        'metrics': {
+            'file': file, 'java_file': java_file, 'test_in_commit': test_in_commit, 'hunk': hunk,
+            'ranges': sum(len(value) for value in ranges.values()), 'func': len(functions),
+        },
+        # parse_stream 必须与分别调用旧方法的结果一致，bytes 输入与文本输入的结果一致
+        'stream_matches': [metrics.file, metrics.java_file, metrics.test_in_commit, metrics.hunk,
+                           metrics.files_and_ranges] == [file, java_file, test_in_commit, hunk, ranges]
+                          and byte_metrics == metrics,
+        'lines': line_count,
+        'bytes': len(diff_bytes),
+        'timings': timings,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None,
+    }
+    return result
+
+def run_isolated(path):
+    """在子进程中运行一个语料，使峰值内存只反映这一个语料。"""
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', path],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{path} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.splitlines()[-1])
+
+def report(name, result):
+    timings = result['timings']
+    rate = result['lines'] / max(timings['parse_stream'], 1e-9)
+    rss = f"{result['peak_rss_mb']:.0f} MB" if result['peak_rss_mb'] is not None else 'n/a'
+    print(f"{name}: {result['lines']:,} lines, {result['bytes'] / 1024 ** 2:.1f} MB, "
+          f"parse_stream {rate:,.0f} lines/s, peak RSS {rss}")
+    for method, seconds in timings.items():
+        print(f"    {method:<30}{seconds * 1000:>12.1f} ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DiffParser 的基准测试和结果校验')
+    parser.add_argument('--update-golden', action='store_true', help='用本次的结果覆盖 golden.json')
+    parser.add_argument('--skip-vendored', action='store_true', help='不运行生成的大 diff')
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case)))
+        sys.exit(0)
+
+    cases = [(os.path.basename(path), path) for path in sorted(glob.glob(os.path.join(corpus_dir, '*.diff')))]
+    with tempfile.TemporaryDirectory() as temp:
+        if not args.skip_vendored:
+            vendored_path = os.path.join(temp, 'vendored.diff')
+            print(f"Generating {vendored_mb} MB vendored diff...")
+            generate_vendored_diff(vendored_path)
+            cases.append(('vendored', vendored_path))
+
+        results = {}
+        for name, path in cases:
+            results[name] = run_isolated(path)
+            report(name, results[name])
+
+    if args.update_golden:
+        golden = {}
+        if os.path.exists(golden_path):
+            with open(golden_path, 'r', encoding='utf-8') as f:
+                golden = json.load(f)
+        golden.update({name: result['metrics'] for name, result in results.items()})
+        with open(golden_path, 'w', encoding='utf-8') as f:
+            json.dump(golden, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Updated {golden_path}")
+        sys.exit(0)
+
+    with open(golden_path, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    failed = False
+    for name, result in results.items():
+        if not result['stream_matches']:
+            print(f"FAIL {name}: parse_stream differs from parse_file/parse_hunk/extract_diff_file_and_lines")
+            failed = True
+        expected = golden.get(name)
+        if expected is None:
+            print(f"FAIL {name}: no golden metrics, run with --update-golden")
+            failed = True
+        elif expected != result['metrics']:
+            print(f"FAIL {name}: expected {expected}, got {result['metrics']}")
+            failed = True
+    print('FAILED' if failed else 'OK')
+    sys.exit(1 if failed else 0)
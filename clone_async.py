@@ -0,0 +1,202 @@
+import time
+import random
+import asyncio
+import subprocess
+
+# stderr 中出现这些内容时认为远程在限流，大幅降低并发
+throttle_markers = ('429', 'rate limit', 'too many requests', 'secondary rate', 'try again later')
+
+# stderr 中出现这些内容时认为是永久错误，不再重试
+permanent_markers = ('not found', 'does not exist', 'does not appear to be a git repository',
+                     'authentication failed', 'could not read username')
+
+# 一个任务最多执行几轮 plan 返回的命令，之后 plan 仍不为空时按失败处理
+max_plan_rounds = 3
+
+def summarize_error(error):
+    """从 git 的 stderr 中取出最能说明问题的一行（优先 fatal: 开头的行）。"""
+    lines = [line for line in error.splitlines() if line.strip()]
+    for line in lines:
+        if line.startswith('fatal:') or line.startswith('error:'):
+            return line
+    return lines[-1] if lines else error
+
+class AdaptiveLimit:
+    """
+    可调整上限的并发控制（AIMD）。
+
+    每完成 window 个任务统计一次吞吐量：比上一个窗口明显提高时并发加一，明显下降时减一；
+    任务失败时减一，遇到限流时减半。
+    """
+
+    def __init__(self, initial=4, maximum=16, minimum=1, window=4):
+        self.limit = max(minimum, min(initial, maximum))
+        self.maximum = maximum
+        self.minimum = minimum
+        self.window = window
+        self.active = 0
+        self.condition = asyncio.Condition()
+        self.window_count = 0
+        self.window_start = time.monotonic()
+        self.last_rate = None
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self):
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    async def record_success(self):
+        async with self.condition:
+            self.window_count += 1
+            if self.window_count < self.window:
+                return
+            now = time.monotonic()
+            rate = self.window_count / max(now - self.window_start, 1e-6)
+            if self.last_rate is None or rate > self.last_rate * 1.05:
+                self.limit = min(self.maximum, self.limit + 1)
+            elif rate < self.last_rate * 0.9:
+                self.limit = max(self.minimum, self.limit - 1)
+            self.last_rate = rate
+            self.window_count = 0
+            self.window_start = now
+            self.condition.notify_all()
+
+    async def record_failure(self, throttled):
+        async with self.condition:
+            if throttled:
+                self.limit = max(self.minimum, self.limit // 2)
+            else:
+                self.limit = max(self.minimum, self.limit - 1)
+            self.last_rate = None
+            self.window_count = 0
+            self.window_start = time.monotonic()
+
+class CloneOrchestrator:
+    """
+    基于 asyncio.create_subprocess_exec 的克隆调度器。
+
+    每个任务提供一个 plan 函数（见 rs.plan_clone），返回还需要执行的 git 命令；
+    调度器执行这些命令直到 plan 返回空列表。失败的任务按指数退避重试，
+    所有任务共享一个重试预算，避免远程故障时无限重试。
+    """
+
+    def __init__(self, concurrency=4, max_concurrency=16, max_retries=3, retry_budget=None,
+                 backoff_base=2.0, backoff_max=120.0):
+        """
+        参数:
+        - concurrency: 初始并发数。
+        - max_concurrency: 并发数上限。
+        - max_retries: 单个任务的最大重试次数。
+        - retry_budget: 所有任务合计的重试次数上限，为 None 时取任务数的一半（至少 10 次）。
+        - backoff_base / backoff_max: 第 n 次重试前等待 min(backoff_max, backoff_base * 2^n) 秒（带随机抖动）。
+        """
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    async def run_command(self, command):
+        """
+        执行一条命令。
+
+        返回:
+        - (returncode, stderr 文本)
+        """
+        proc = await asyncio.create_subprocess_exec(*command, stdin=subprocess.DEVNULL,
+                                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        _, stderr = await proc.communicate()
+        return proc.returncode, stderr.decode('utf-8', errors='replace')
+
+    async def execute(self, plan):
+        """
+        反复执行 plan 返回的命令，直到 plan 返回空列表。
+
+        返回:
+        - 成功时为 None，失败时为错误信息；执行 max_plan_rounds 轮之后 plan 仍不为空也算失败。
+        """
+        for round_number in range(max_plan_rounds + 1):
+            commands = await asyncio.to_thread(plan)
+            if not commands:
+                return None
+            if round_number == max_plan_rounds:
+                return f"still incomplete after {max_plan_rounds} rounds: {' '.join(commands[0][:4])}"
+            for command in commands:
+                returncode, stderr = await self.run_command(command)
+                if returncode != 0:
+                    return stderr.strip() or f"{command[:4]} exited with {returncode}"
+
+    async def run_task(self, name, plan):
+        """
+        执行一个任务，失败时按指数退避重试。
+
+        返回:
+        - 是否成功。
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.limit.acquire()
+            try:
+                error = await self.execute(plan)
+            except Exception as e:
+                error = str(e)
+            finally:
+                await self.limit.release()
+
+            if error is None:
+                await self.limit.record_success()
+                return True
+
+            lowered = error.lower()
+            throttled = any(marker in lowered for marker in throttle_markers)
+            await self.limit.record_failure(throttled)
+            if any(marker in lowered for marker in permanent_markers):
+                print(f"Error cloning {name}: {summarize_error(error)}")
+                return False
+            if attempt == self.max_retries or self.budget <= 0:
+                print(f"Error cloning {name} after {attempt + 1} attempts: {summarize_error(error)}")
+                return False
+            self.budget -= 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"Retrying {name} in {delay:.1f}s (concurrency {self.limit.limit}): {summarize_error(error)}")
+            await asyncio.sleep(delay)
+        return False
+
+    async def run_group(self, group):
+        """依次执行一组任务（例如同一项目族的仓库），并报告进度。"""
+        for name, plan in group:
+            ok = await self.run_task(name, plan)
+            self.results[name] = ok
+            self.report(name, ok)
+
+    def report(self, name, ok):
+        """打印进度和预计剩余时间。"""
+        done = len(self.results)
+        elapsed = time.monotonic() - self.started
+        eta = elapsed / done * (self.total - done)
+        failed = sum(1 for result in self.results.values() if not result)
+        print(f"[clone {done}/{self.total}] {name} {'ok' if ok else 'failed'}, "
+              f"failed {failed}, concurrency {self.limit.limit}, elapsed {elapsed:.0f}s, ETA {eta:.0f}s")
+
+    async def run(self, groups):
+        """
+        执行所有任务。
+
+        参数:
+        - groups: [[(name, plan), ...], ...]，组与组之间并发，组内依次执行。
+
+        返回:
+        - {name: 是否成功}
+        """
+        self.limit = AdaptiveLimit(self.concurrency, self.max_concurrency)
+        self.total = sum(len(group) for group in groups)
+        self.budget = self.retry_budget if self.retry_budget is not None else max(10, self.total // 2)
+        self.results = {}
+        self.started = time.monotonic()
+        await asyncio.gather(*(self.run_group(group) for group in groups))
+        return self.results
@@ -0,0 +1,97 @@
+import os
+import re
+import subprocess
+from collections import namedtuple
+from mirror_store import get_family
+from tree_index import LruCache
+
+# 提交 URL 的各部分，允许 http、www.、大写的哈希、#diff-... 锚点、?w=1 之类的参数和 .patch / .diff 后缀
+commit_url_pattern = re.compile(
+    r'^(?:https?://)?(?:www\.)?github\.com/([^/\s]+)/([^/\s]+?)(?:\.git)?/commit/([0-9A-Fa-f]{4,40})'
+    r'(?:\.patch|\.diff)?/?(?:[?#].*)?$')
+
+# 规范化后的提交：repository_name 为 URL 中的 owner/repo，sha 为小写的哈希（可能是短哈希）
+CommitRef = namedtuple('CommitRef', ['repository_name', 'sha'])
+
+def parse_commit_url(url):
+    """
+    解析提交 URL。
+
+    参数:
+    - url: 提交的 GitHub URL，例如 https://github.com/o/r/commit/abc#diff-123。
+
+    返回:
+    - CommitRef，不是提交 URL 时返回 None。
+    """
+    match = commit_url_pattern.match(url.strip())
+    if match is None:
+        return None
+    owner, repo, sha = match.groups()
+    return CommitRef(f'{owner}/{repo}', sha.lower())
+
+def format_commit_url(ref):
+    """把 CommitRef 还原为规范的提交 URL。"""
+    return f'https://github.com/{ref.repository_name}/commit/{ref.sha}'
+
+class CommitIndex:
+    """
+    提交 URL 的规范化索引。
+
+    同一个提交常常以不同的 URL 出现：带 #diff-... 锚点、短哈希、仓库改名前后的名字、不同 fork 中的同一提交
+    （改名和 fork 需要在 mirror_store.mirror_families 中登记为同一项目族）。
+    get_key 把它们映射到同一个键 (项目族, 完整哈希)：同一项目族（mirror_store.get_family）中
+    哈希相同的提交内容也相同，分析一次即可。已分析过的键的结果保存在一个有上限的 LRU 中，
+    淘汰后的键再次出现时只是重新分析，不影响结果。
+    """
+
+    def __init__(self, resolve_path=None, result_cache_size=100000):
+        """
+        参数:
+        - resolve_path: 函数 owner/repo -> 本地仓库路径，用 git rev-parse 把短哈希补全；为 None 时不补全。
+        - result_cache_size: 保存的分析结果数上限。
+        """
+        self.resolve_path = resolve_path
+        self.results = LruCache(result_cache_size)
+
+    def resolve_sha(self, ref):
+        """
+        把短哈希补全为完整哈希，仓库不在本地、哈希不存在或有歧义时原样返回。
+
+        短哈希很少，每个只启动一次 git rev-parse，主进程中不留下常驻的 git cat-file 进程。
+        """
+        if len(ref.sha) == 40 or self.resolve_path is None:
+            return ref.sha
+        repo_path = self.resolve_path(ref.repository_name)
+        if not os.path.isdir(repo_path):
+            return ref.sha
+        result = subprocess.run(['git', '-C', repo_path, 'rev-parse', '--verify', '--quiet', ref.sha + '^{commit}'],
+                                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return result.stdout.decode('ascii').strip() if result.returncode == 0 else ref.sha
+
+    def normalize(self, url):
+        """
+        返回:
+        - 规范的提交 URL 和去重用的键 (canonical_url, key)；不是提交 URL 时返回 (url, None)，按原样分析。
+        """
+        ref = parse_commit_url(url)
+        if ref is None:
+            return url, None
+        ref = ref._replace(sha=self.resolve_sha(ref))
+        # 无法补全的短哈希只在同一个仓库内去重，不同项目的短哈希可能碰巧相同
+        owner_key = get_family(ref.repository_name) if len(ref.sha) == 40 else ref.repository_name.lower()
+        return format_commit_url(ref), (owner_key, ref.sha)
+
+    def get_result(self, key):
+        """已分析过的键的结果行，没有时返回 None。"""
+        return self.results.get(key) if key is not None else None
+
+    def put_result(self, key, row):
+        if key is not None and row is not None:
+            self.results.put(key, row)
+
+def fan_out(url, row):
+    """
+    把一个提交的分析结果复制到引用它的另一行：url 和 repo 取这一行自己的，其余各列相同。
+    """
+    ref = parse_commit_url(url)
+    return [url, ref.repository_name if ref is not None else row[1]] + row[2:]
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+
+# 超过上限时淘汰到 max_bytes 的这个比例，留出余量，之后的写入不必每次都淘汰
+evict_target = 0.9
+
+class DiffCache:
+    """
+    以 (仓库, 提交哈希) 为键的本地缓存，保存压缩后的 diff 和解析得到的指标。
+
+    - diffs 表: 压缩的原始 diff，与解析逻辑无关，解析逻辑改变后可以直接重新解析。
+    - metrics 表: 再加上 parser_version 作为键，解析逻辑改变后旧的结果自然失效。
+
+    缓存总大小超过 max_bytes 时，按最近访问时间淘汰最久未用的记录（LRU）。
+    总大小由触发器记在 cache_size 表中，写入时不再扫描全表；多个进程可以同时打开同一个缓存文件。
+    """
+
+    def __init__(self, path, max_bytes=2 * 1024 ** 3):
+        """
+        参数:
+        - path: SQLite 缓存文件路径。
+        - max_bytes: 缓存的总大小上限（压缩后的 diff 加上指标）。
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # INSERT OR REPLACE 替换旧行时也触发 DELETE 触发器，cache_size 才能减去旧行的大小
+        self.conn.execute('PRAGMA recursive_triggers=ON')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS diffs (
+                repo TEXT NOT NULL,
+                sha TEXT NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (repo, sha)
+            );
+            CREATE TABLE IF NOT EXISTS metrics (
+                repo TEXT NOT NULL,
+                sha TEXT NOT NULL,
+                version TEXT NOT NULL,
+                row TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (repo, sha, version)
+            );
+            CREATE INDEX IF NOT EXISTS diffs_last_access ON diffs (last_access);
+            CREATE TABLE IF NOT EXISTS cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                total INTEGER NOT NULL
+            );
+            BEGIN IMMEDIATE;
+            CREATE TRIGGER IF NOT EXISTS diffs_insert AFTER INSERT ON diffs
+                BEGIN UPDATE cache_size SET total = total + NEW.size; END;
+            CREATE TRIGGER IF NOT EXISTS diffs_delete AFTER DELETE ON diffs
+                BEGIN UPDATE cache_size SET total = total - OLD.size; END;
+            CREATE TRIGGER IF NOT EXISTS metrics_insert AFTER INSERT ON metrics
+                BEGIN UPDATE cache_size SET total = total + LENGTH(NEW.row); END;
+            CREATE TRIGGER IF NOT EXISTS metrics_delete AFTER DELETE ON metrics
+                BEGIN UPDATE cache_size SET total = total - LENGTH(OLD.row); END;
+            -- 之前的版本创建的缓存文件没有总大小，只在第一次打开时统计一次
+            INSERT OR IGNORE INTO cache_size
+                SELECT 0, (SELECT COALESCE(SUM(size), 0) FROM diffs) + (SELECT COALESCE(SUM(LENGTH(row)), 0) FROM metrics);
+            COMMIT;
+        ''')
+
+    def get_metrics(self, repo, sha, version):
+        """
+        读取缓存的指标。
+
+        返回:
+        - 写入时的列表，不存在时返回 None。
+        """
+        with self.lock:
+            found = self.conn.execute('SELECT row FROM metrics WHERE repo=? AND sha=? AND version=?',
+                                      (repo, sha, version)).fetchone()
+            if found is None:
+                return None
+            now = time.time()
+            self.conn.execute('UPDATE metrics SET last_access=? WHERE repo=? AND sha=? AND version=?',
+                              (now, repo, sha, version))
+            self.conn.execute('UPDATE diffs SET last_access=? WHERE repo=? AND sha=?', (now, repo, sha))
+            self.conn.commit()
+            return json.loads(found[0])
+
+    def put_metrics(self, repo, sha, version, row):
+        """保存一次分析的指标，row 需要能被 JSON 序列化。"""
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?)',
+                              (repo, sha, version, json.dumps(row, ensure_ascii=False), time.time()))
+            self.conn.commit()
+        self.evict()
+
+    def get_diff(self, repo, sha, raw=False):
+        """
+        读取缓存的 diff。
+
+        参数:
+        - raw: 为 True 时返回 git 输出的原始字节，不做解码。
+
+        返回:
+        - diff 文本（raw 时为 bytes），不存在时返回 None。
+        """
+        with self.lock:
+            found = self.conn.execute('SELECT data FROM diffs WHERE repo=? AND sha=?', (repo, sha)).fetchone()
+            if found is None:
+                return None
+            self.conn.execute('UPDATE diffs SET last_access=? WHERE repo=? AND sha=?', (time.time(), repo, sha))
+            self.conn.commit()
+        data = zlib.decompress(found[0])
+        return data if raw else data.decode('utf-8', errors='replace')
+
+    def put_diff(self, repo, sha, data):
+        """
+        保存 diff。
+
+        参数:
+        - data: 已经用 zlib 压缩的 diff（见 DiffRecorder），或 diff 文本。
+        """
+        if isinstance(data, str):
+            data = zlib.compress(data.encode('utf-8'))
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO diffs VALUES (?, ?, ?, ?, ?)',
+                              (repo, sha, data, len(data), time.time()))
+            self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        """
+        总大小超过 max_bytes 时，按最近访问时间淘汰最久未用的提交（diff 和它的全部指标），
+        直到总大小不超过 max_bytes * evict_target。没有超过时只读取 cache_size 的一行。
+        """
+        with self.lock:
+            total = self.conn.execute('SELECT total FROM cache_size WHERE id=0').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            target = self.max_bytes * evict_target
+            entries = self.conn.execute('''
+                SELECT repo, sha, MAX(last_access), SUM(size) FROM (
+                    SELECT repo, sha, last_access, size FROM diffs
+                    UNION ALL
+                    SELECT repo, sha, last_access, LENGTH(row) FROM metrics
+                ) GROUP BY repo, sha ORDER BY MAX(last_access)
+            ''').fetchall()
+            victims = []
+            for repo, sha, _, size in entries:
+                if total <= target:
+                    break
+                victims.append((repo, sha))
+                total -= size
+            if victims:
+                self.conn.executemany('DELETE FROM diffs WHERE repo=? AND sha=?', victims)
+                self.conn.executemany('DELETE FROM metrics WHERE repo=? AND sha=?', victims)
+                self.conn.commit()
+
+    def get_total(self):
+        """缓存的总大小（压缩后的 diff 加上指标）。"""
+        with self.lock:
+            return self.conn.execute('SELECT total FROM cache_size WHERE id=0').fetchone()[0]
+
+    def prune(self, parser_version):
+        """
+        删除旧的解析版本留下的指标。
+
+        参数:
+        - parser_version: 当前的解析版本。指标的 version 以 "<解析版本>:" 开头，
+          同一解析版本下其他语言和 --pathspec-filter 模式的指标保留。
+        """
+        with self.lock:
+            self.conn.execute('DELETE FROM metrics WHERE substr(version, 1, ?)<>?',
+                              (len(parser_version) + 1, parser_version + ':'))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class DiffRecorder:
+    """
+    在流式解析 diff 的同时把每一行压缩保存下来，内存中只保留压缩后的数据。
+    行可以是 bytes（二进制模式的管道，原样保存）或文本。
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.compressor = zlib.compressobj()
+        self.chunks = []
+
+    def __iter__(self):
+        for line in self.lines:
+            data = line if isinstance(line, bytes) else line.encode('utf-8', errors='surrogateescape')
+            self.chunks.append(self.compressor.compress(data))
+            yield line
+
+    def data(self):
+        """返回压缩后的完整 diff。"""
+        self.chunks.append(self.compressor.flush())
+        return b''.join(self.chunks)
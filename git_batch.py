@@ -0,0 +1,212 @@
+import os
+import re
+import atexit
+import threading
+import subprocess
+import profiler
+
+# 找到对象时的响应头 "<sha> <type> <size>"；对象不存在或有歧义时为 "<对象名> missing" / "<对象名> ambiguous"，
+# 对象名中可能有空格，不能只按字段数判断
+object_header_pattern = re.compile(rb'([0-9a-f]{40}|[0-9a-f]{64}) ([a-z]+) (\d+)\n')
+
+class CatFile:
+    """
+    对一个仓库常驻的 git cat-file --batch / --batch-check 进程。
+
+    提交头、树和文件内容都通过管道读取，不需要为每次查询启动新的 git 进程。
+    同一个对象可以被多个线程共享，每次请求都在锁内完成。
+    """
+
+    def __init__(self, repo_path):
+        """
+        参数:
+        - repo_path: 本地仓库路径（工作区或裸仓库均可）。
+        """
+        self.repo_path = repo_path
+        self.lock = threading.Lock()
+        self.batch = None
+        self.check = None
+
+    def _start(self, option):
+        profiler.add('subprocesses')
+        return subprocess.Popen(['git', '-C', self.repo_path, 'cat-file', option],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def _request(self, proc, rev):
+        """
+        向进程写入一行对象名并读取响应头。
+
+        返回:
+        - 响应头的字段列表 [sha, type, size]，对象不存在、有歧义或进程已退出时返回 None。
+        """
+        if '\n' in rev:
+            return None  # 换行会被当作两个请求，之后的响应全部错位
+        try:
+            proc.stdin.write(rev.encode('utf-8') + b'\n')
+            proc.stdin.flush()
+            header = proc.stdout.readline()
+        except (OSError, ValueError):
+            return None
+        match = object_header_pattern.fullmatch(header)
+        if match is None:
+            if header and not header.endswith((b' missing\n', b' ambiguous\n')):
+                # 无法识别的响应，不知道后面还有多少内容，结束进程，下次请求时重新启动
+                proc.kill()
+            return None
+        return list(match.groups())
+
+    def read_object(self, rev):
+        """
+        读取一个对象。
+
+        参数:
+        - rev: 对象名，例如提交哈希、"<hash>^{tree}" 或 "<hash>:<path>"。
+
+        返回:
+        - (sha, type, data)，对象不存在时返回 None。
+        """
+        with self.lock:
+            if self.batch is None or self.batch.poll() is not None:
+                self.batch = self._start('--batch')
+            fields = self._request(self.batch, rev)
+            if fields is None:
+                return None
+            size = int(fields[2])
+            data = self.batch.stdout.read(size)
+            profiler.add('bytes', size)
+            self.batch.stdout.read(1)  # 对象内容后面跟一个换行
+            return fields[0].decode('ascii'), fields[1].decode('ascii'), data
+
+    def check_object(self, rev):
+        """
+        只查询对象的类型和大小，不读取内容。
+
+        返回:
+        - (sha, type, size)，对象不存在时返回 None。
+        """
+        with self.lock:
+            if self.check is None or self.check.poll() is not None:
+                self.check = self._start('--batch-check')
+            fields = self._request(self.check, rev)
+            if fields is None:
+                return None
+            return fields[0].decode('ascii'), fields[1].decode('ascii'), int(fields[2])
+
+    def read_commit(self, rev):
+        """
+        读取并解析提交头。
+
+        返回:
+        - 包含 sha、tree、parents、author、committer、subject、message 的字典，失败时返回 None。
+        """
+        obj = self.read_object(rev)
+        if obj is None or obj[1] != 'commit':
+            return None
+        text = obj[2].decode('utf-8', errors='replace')
+        head, _, message = text.partition('\n\n')
+        commit = {'sha': obj[0], 'tree': None, 'parents': [], 'author': None, 'committer': None}
+        for line in head.splitlines():
+            key, _, value = line.partition(' ')
+            if key == 'tree':
+                commit['tree'] = value
+            elif key == 'parent':
+                commit['parents'].append(value)
+            elif key in ('author', 'committer'):
+                commit[key] = value
+        # 与 git show --format=%s 一致：第一段的多行合并为一行
+        commit['subject'] = ' '.join(line.strip() for line in message.split('\n\n')[0].splitlines()).strip()
+        commit['message'] = message
+        return commit
+
+    def read_tree(self, rev, recursive=True, prefix=''):
+        """
+        列出树中的条目，相当于 git ls-tree [-r]。
+
+        参数:
+        - rev: 提交或树的对象名。
+        - recursive: 是否递归展开子目录（只返回文件，与 ls-tree -r 相同）。
+
+        返回:
+        - [(mode, type, sha, path), ...]，对象不存在时返回空列表。
+        """
+        obj = self.read_object(rev if rev.endswith('^{tree}') or ':' in rev else rev + '^{tree}')
+        if obj is None or obj[1] != 'tree':
+            return []
+        entries = []
+        data = obj[2]
+        pos = 0
+        while pos < len(data):
+            space = data.index(b' ', pos)
+            nul = data.index(b'\0', space)
+            mode = data[pos:space].decode('ascii')
+            name = data[space + 1:nul].decode('utf-8', errors='surrogateescape')
+            sha = data[nul + 1:nul + 21].hex()
+            pos = nul + 21
+            path = prefix + name
+            if mode == '40000':
+                if recursive:
+                    entries.extend(self.read_tree(sha, True, path + '/'))
+                else:
+                    entries.append((mode, 'tree', sha, path))
+            elif mode == '160000':
+                entries.append((mode, 'commit', sha, path))
+            else:
+                entries.append((mode, 'blob', sha, path))
+        return entries
+
+    def read_blob(self, rev, path=None):
+        """
+        读取文件内容。
+
+        参数:
+        - rev: 提交哈希或 blob 哈希。
+        - path: 文件在提交中的路径，为 None 时 rev 本身就是 blob。
+
+        返回:
+        - 文件的 bytes 内容，不存在时返回 None。
+        """
+        obj = self.read_object(rev if path is None else f'{rev}:{path}')
+        if obj is None or obj[1] != 'blob':
+            return None
+        return obj[2]
+
+    def close(self):
+        """关闭所有常驻进程。"""
+        with self.lock:
+            for proc in (self.batch, self.check):
+                if proc is not None and proc.poll() is None:
+                    try:
+                        proc.stdin.close()
+                        proc.wait(timeout=5)
+                    except (OSError, subprocess.TimeoutExpired):
+                        proc.kill()
+            self.batch = None
+            self.check = None
+
+# 每个仓库一个 CatFile，按仓库路径复用
+_pool = {}
+_pool_lock = threading.Lock()
+
+def get_cat_file(repo_path):
+    """
+    从进程池中取得指定仓库的 CatFile，不存在时创建。
+
+    参数:
+    - repo_path: 本地仓库路径，例如 os.path.join(base_path1, repo)。
+    """
+    key = os.path.normcase(os.path.abspath(repo_path))
+    with _pool_lock:
+        cat = _pool.get(key)
+        if cat is None:
+            cat = _pool[key] = CatFile(repo_path)
+        return cat
+
+def close_all():
+    """关闭进程池中的所有 git 进程。"""
+    with _pool_lock:
+        cats = list(_pool.values())
+        _pool.clear()
+    for cat in cats:
+        cat.close()
+
+atexit.register(close_all)
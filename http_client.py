@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse, urlencode
+from requests.adapters import HTTPAdapter
+
+# 磁盘 HTTP 缓存目录，为 None 时不缓存
+http_cache_dir = None
+
+# 每个主机的请求速率 (每秒请求数, 突发数)，没有列出的主机使用 default_rate
+host_rates = {
+    'services.nvd.nist.gov': (5 / 30, 5),  # 没有 API key 时 30 秒 5 次
+    'api.github.com': (1.0, 10),
+}
+default_rate = (2.0, 5)
+
+# 这些状态码表示被限流，按 Retry-After 或退避时间等待后重试
+throttle_status = (403, 429, 503)
+
+class TokenBucket:
+    """
+    一个主机的令牌桶。
+
+    每个请求消耗一个令牌，令牌按 rate 恢复，最多积累 capacity 个。
+    响应头中的 X-RateLimit-Remaining / X-RateLimit-Reset 会把速率调整为剩余次数平摊到重置前，
+    Retry-After 或剩余次数为 0 时暂停到指定时间。
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """等待直到可以发出一个请求。"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """在 seconds 秒内不再发出请求。"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def observe(self, remaining, reset_in):
+        """
+        根据服务器报告的剩余次数调整速率。
+
+        参数:
+        - remaining: 重置前还可以发出的请求数。
+        - reset_in: 距离重置的秒数。
+        """
+        if remaining <= 0:
+            self.pause(reset_in)
+            return
+        with self.lock:
+            self.tokens = min(self.tokens, remaining)
+            if reset_in > 0:
+                self.rate = remaining / reset_in
+
+def parse_retry_after(value):
+    """把 Retry-After（秒数或 HTTP 日期）转换为需要等待的秒数，无法解析时返回 None。"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class HttpCache:
+    """
+    按 URL 保存响应的磁盘缓存。
+
+    只保存带 ETag 或 Last-Modified 的 200 响应，再次请求时带上 If-None-Match / If-Modified-Since，
+    服务器返回 304 时直接使用缓存的内容。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get_paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        folder = os.path.join(self.directory, key[:2])
+        return os.path.join(folder, key + '.json'), os.path.join(folder, key + '.body')
+
+    def load(self, url):
+        """
+        返回:
+        - (元数据字典, 内容 bytes)，没有缓存时返回 None。
+        """
+        meta_path, body_path = self.get_paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def save(self, url, response):
+        """保存响应，没有 ETag 和 Last-Modified 时不保存。"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag is None and last_modified is None:
+            return
+        meta_path, body_path = self.get_paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified,
+                'content_type': response.headers.get('Content-Type'), 'encoding': response.encoding}
+        # 先写临时文件再替换，中断时不会留下不完整的缓存
+        for path, data in ((body_path, response.content),
+                           (meta_path, json.dumps(meta).encode('utf-8'))):
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+
+def build_response(url, meta, body):
+    """用缓存的内容构造一个 200 响应，调用方可以像普通响应一样使用 .text / .json()。"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = body
+    response.encoding = meta.get('encoding')
+    if meta.get('content_type'):
+        response.headers['Content-Type'] = meta['content_type']
+    if meta.get('etag'):
+        response.headers['ETag'] = meta['etag']
+    if meta.get('last_modified'):
+        response.headers['Last-Modified'] = meta['last_modified']
+    response.from_cache = True
+    return response
+
+class HttpClient:
+    """
+    共享的 HTTP 客户端。
+
+    - 一个 requests.Session 复用连接（keep-alive），不再每次请求都重新握手。
+    - 每个主机一个 TokenBucket 控制请求速率，代替固定的 time.sleep。
+    - cache_dir 不为 None 时对 GET 请求使用 HttpCache 做条件请求。
+    """
+
+    def __init__(self, cache_dir=None, pool_size=16, headers=None, max_attempts=4):
+        """
+        参数:
+        - cache_dir: 磁盘缓存目录，为 None 时不缓存。
+        - pool_size: 每个主机的连接池大小。
+        - headers: 所有请求都带上的请求头，例如 GitHub 的 Authorization。
+        - max_attempts: 被限流或网络错误时的最大尝试次数。
+        """
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.cache = HttpCache(cache_dir) if cache_dir else None
+        self.max_attempts = max_attempts
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, host):
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(*host_rates.get(host, default_rate))
+            return bucket
+
+    def set_rate(self, host, rate, capacity):
+        """修改一个主机的请求速率，例如有 API key 时放宽 NVD 的限制。"""
+        with self.lock:
+            self.buckets[host] = TokenBucket(rate, capacity)
+
+    def observe(self, bucket, response):
+        """
+        根据响应头调整令牌桶。
+
+        返回:
+        - 被限流时需要等待的秒数（0 表示没有提示，按指数退避），没有被限流时返回 None。
+        """
+        now = time.time()
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is not None and reset is not None:
+            try:
+                bucket.observe(int(remaining), max(0.0, float(reset) - now))
+            except ValueError:
+                pass
+        if response.status_code not in throttle_status:
+            return None
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is None and remaining == '0' and reset is not None:
+            retry_after = max(0.0, float(reset) - now)
+        if retry_after is None and response.status_code == 403:
+            return None  # 普通的权限错误，不是限流
+        # 429 / 503 没有给出等待时间时返回 0，由调用方按指数退避等待
+        return retry_after if retry_after is not None else 0.0
+
+    def get(self, url, params=None, headers=None, timeout=60, use_cache=True):
+        """
+        发送 GET 请求。
+
+        参数:
+        - url / params / headers / timeout: 与 requests.get 相同。
+        - use_cache: 是否使用磁盘缓存（分页下载等只用一次的请求可以关闭）。
+
+        返回:
+        - requests.Response，从缓存得到时 response.from_cache 为 True。
+
+        网络错误和限流会按 Retry-After 或指数退避重试，最后一次的异常会抛出。
+        """
+        full_url = url + ('&' if '?' in url else '?') + urlencode(params) if params else url
+        bucket = self.get_bucket(urlparse(full_url).netloc)
+        cached = self.cache.load(full_url) if self.cache is not None and use_cache else None
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if cached[0].get('etag'):
+                request_headers['If-None-Match'] = cached[0]['etag']
+            if cached[0].get('last_modified'):
+                request_headers['If-Modified-Since'] = cached[0]['last_modified']
+
+        for attempt in range(self.max_attempts):
+            bucket.acquire()
+            try:
+                response = self.session.get(full_url, headers=request_headers, timeout=timeout)
+            except requests.RequestException:
+                if attempt == self.max_attempts - 1:
+                    raise
+                time.sleep(2 ** attempt)
+                continue
+
+            wait = self.observe(bucket, response)
+            if wait is not None and attempt < self.max_attempts - 1:
+                wait = wait or 2 ** attempt
+                print(f"Rate limited by {urlparse(full_url).netloc}, waiting {wait:.0f}s")
+                bucket.pause(wait)
+                continue
+            if response.status_code == 304 and cached is not None:
+                return build_response(full_url, *cached)
+            if response.status_code == 200 and self.cache is not None and use_cache:
+                self.cache.save(full_url, response)
+            response.from_cache = False
+            return response
+        return response
+
+# 每个进程一个共享的客户端
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """返回当前进程共享的 HttpClient，缓存目录取 http_cache_dir。"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(http_cache_dir)
+        return _client
@@ -0,0 +1,103 @@
+import re
+import csv
+import hashlib
+from collections import namedtuple
+
+# 输入中的一行提交：line 为在文件中的行号（从 1 开始），cve / cwe 不存在时为空字符串
+CommitRow = namedtuple('CommitRow', ['line', 'url', 'cve', 'cwe'])
+
+# 带表头的输入格式：表头中出现 url 列名时使用这个格式，表头中没有的 cve / cwe 列取空字符串
+Schema = namedtuple('Schema', ['name', 'url', 'cve', 'cwe'])
+
+header_schemas = [
+    Schema('vul4j', 'human_patch', 'cve_id', 'cwe_id'),          # vul4j_dataset.csv
+    Schema('nvd', 'GitHub commit URL', 'CVE ID', 'CWE'),          # Script2.py 的 output.csv
+    Schema('results', 'url', 'cve_id', 'cwe'),                    # rs.py 的输出、test2.py 的 out.csv
+]
+
+commit_url_pattern = re.compile(r'https?://github\.com/[^/\s]+/[^/\s]+/commit/[0-9A-Fa-f]+')
+cve_pattern = re.compile(r'CVE-\d{4}-\d+')
+cwe_pattern = re.compile(r'CWE-\d+')
+
+def detect_schema(row):
+    """
+    根据第一行判断输入的格式。
+
+    参数:
+    - row: 输入的第一行。
+
+    返回:
+    - (Schema, 列号字典)，第一行是已知的表头时返回；否则返回 (None, None)，表示没有表头，
+      每一行按内容找出提交 URL、CVE 和 CWE（java_repos.csv、1.csv、veracode_fliter.csv 等）。
+    """
+    names = [cell.strip() for cell in row]
+    for schema in header_schemas:
+        if schema.url in names:
+            columns = {field: names.index(getattr(schema, field))
+                       for field in ('url', 'cve', 'cwe') if getattr(schema, field) in names}
+            return schema, columns
+    return None, None
+
+def find_cell(row, pattern):
+    """返回第一个匹配 pattern 的单元格，没有时返回空字符串。"""
+    for cell in row:
+        if pattern.search(cell):
+            return cell.strip()
+    return ''
+
+def parse_headerless(row):
+    """
+    从没有表头的一行中找出 (提交 URL, CVE, CWE)。
+
+    CWE 取整行中出现的所有编号并按 java_repos.csv 的写法连在一起（例如 CWE-74CWE-113），
+    test2.py 输出的 ['CWE-79', 'CWE-20'] 会被 CSV 拆成几个单元格，也能完整取到。
+    """
+    cve = cve_pattern.search(','.join(row))
+    return find_cell(row, commit_url_pattern), cve.group(0) if cve else '', ''.join(cwe_pattern.findall(','.join(row)))
+
+def url_key(url):
+    """去重用的 8 字节摘要，一百万个 URL 只占几十 MB，而不是保存完整的字符串。"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def read_commits(path, dedup=True):
+    """
+    逐行读取输入 CSV 中的提交，读到一行就返回一行，不把整个文件读入内存。
+
+    参数:
+    - path: 输入 CSV 文件路径。
+    - dedup: 是否跳过重复出现的提交 URL（保留第一次出现的行）。
+
+    返回:
+    - CommitRow 的生成器。没有提交 URL 的行会被跳过。
+    """
+    seen = set()
+    skipped = duplicates = 0
+    with open(path, newline='', encoding='utf-8', errors='replace') as f:
+        reader = csv.reader(f)
+        schema = columns = None
+        for line, row in enumerate(reader, 1):
+            if line == 1:
+                schema, columns = detect_schema(row)
+                if schema is not None:
+                    print(f"Detected {schema.name} input: {path}")
+                    continue
+            if schema is not None:
+                cells = {field: row[index].strip() if index < len(row) else '' for field, index in columns.items()}
+                url, cve, cwe = cells['url'], cells.get('cve', ''), cells.get('cwe', '')
+                if not commit_url_pattern.search(url):
+                    # test2.py 写出的 CWE 列表中的逗号没有转义，这样的行各列会错位，改为按内容查找
+                    url, cve, cwe = parse_headerless(row)
+            else:
+                url, cve, cwe = parse_headerless(row)
+            if not commit_url_pattern.search(url):
+                skipped += 1
+                continue
+            if dedup:
+                key = url_key(url)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+            yield CommitRow(line, url, cve, cwe)
+    if skipped or duplicates:
+        print(f"{path}: skipped {skipped} rows without a commit URL, {duplicates} duplicate URLs")
@@ -1,7 +1,9 @@
-import requests
-import time
+import os
 import csv
 import re
+import argparse
+import subprocess
+from http_client import get_client
 
 isTest = 0
 num = 0
@@ -20,41 +22,89 @@ def is_func(str):
             return index
     return -1
 
-def get_repo_contents(prj, path=""):
-    url = f"https://api.github.com/repos/{prj}/contents/{path}"
-    time.sleep(6)
-    print(123)
-    print("[prj]:",prj)
-    print("[path]:",path)
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Failed to retrieve repository contents for {path}.")
+# 本地仓库目录（rs.py 的 base_path1），其中有 <repo> 的克隆时用 git ls-tree，否则请求 GitHub 的 trees 接口；
+# 用 --local-repo-base 设置
+local_repo_base = None
+
+# 提交 URL 中的仓库名和提交哈希，后面可以带 .diff / .patch
+commit_url_pattern = re.compile(r'github\.com/([^/\s]+/[^/\s]+)/commit/([0-9A-Fa-f]+)')
+
+# 与源文件对应的测试文件名，name 为文件名，stem 和 ext 为去掉和保留的扩展名
+test_name_formats = ['Test{name}', '{stem}Test{ext}', '{stem}Tests{ext}']
+
+# 已经取得的树，按 (prj, commit) 缓存
+tree_indexes = {}
+
+def get_tree_paths(prj, commit):
+    """
+    一次取得提交中所有文件的路径。
+
+    参数:
+    - prj: owner/repo 形式的仓库名。
+    - commit: 提交哈希。
+
+    返回:
+    - 路径列表，失败时返回 None。
+    """
+    if local_repo_base is not None:
+        repo_path = os.path.join(local_repo_base, prj.split('/')[1])
+        if os.path.isdir(repo_path):
+            result = subprocess.run(['git', '-C', repo_path, 'ls-tree', '-r', '--name-only', '-z', commit],
+                                    capture_output=True)
+            if result.returncode == 0:
+                return result.stdout.decode('utf-8', errors='replace').split('\0')[:-1]
+
+    url = f"https://api.github.com/repos/{prj}/git/trees/{commit}?recursive=1"
+    response = get_client().get(url)
+    if response.status_code != 200:
+        print(f"Failed to retrieve tree of {prj} at {commit}.")
         return None
+    data = response.json()
+    if data.get('truncated'):
+        print(f"Tree of {prj} at {commit} is truncated, some test files may be missed.")
+    return [item['path'] for item in data.get('tree', []) if item['type'] == 'blob']
+
+def get_tree_index(prj, commit):
+    """
+    返回提交的文件名索引 {文件名: [路径, ...]}，每个提交只取一次树。
+    """
+    key = (prj, commit)
+    if key not in tree_indexes:
+        index = {}
+        for path in get_tree_paths(prj, commit) or []:
+            index.setdefault(path.rsplit('/', 1)[-1], []).append(path)
+        tree_indexes[key] = index
+    return tree_indexes[key]
 
 def get_test_files(prj, path="", goal = ""):
-    def match_test_file(filename):
-        assert isinstance(filename, str)
-        pattern = "^Test" + re.escape(str) + "$"
-        return bool(re.match(pattern, filename))
-        # return True
-
-    contents = get_repo_contents(prj, path)
-    # file = open(output_file, "a")
-    if contents is not None:
-        for item in contents:
-            if item['type'] == 'file' and match_test_file(item['name']):
-                return True
-            elif item['type'] == 'dir':
-                return get_test_files(prj, item['path'])
-                # file.write(item['name'])
-    # file.close()
-    return False
+    """
+    查找仓库中是否有与 goal 对应的测试文件，例如 Foo.java 对应 TestFoo.java、FooTest.java。
+
+    参数:
+    - prj: owner/repo 形式的仓库名。
+    - path: 提交哈希。
+    - goal: 源文件名。
+    """
+    stem, dot, ext = goal.rpartition('.')
+    if not dot:
+        stem, ext = goal, ''
+    ext = dot + ext
+    index = get_tree_index(prj, path)
+    return any(name_format.format(name=goal, stem=stem, ext=ext) in index for name_format in test_name_formats)
 
 def deal_with_url( url ):
-    res = requests.get(url)
-    time.sleep(6)
+    """
+    下载提交的 diff，统计 file、func、hunk，并在仓库中查找修改的文件对应的测试文件。
+
+    参数:
+    - url: 提交的 GitHub URL，不带 .diff 后缀。
+    """
+    match = commit_url_pattern.search(url)
+    if match is None:
+        print(f"Not a commit URL: {url}")
+        return
+    prj, commit = match.groups()  # 整个提交只解析一次，查找测试文件时使用同一个提交哈希
+    res = get_client().get(url + ".diff")
     # 初始化部分
     s = res.text.splitlines(keepends = False)
     file = 0
@@ -77,10 +127,7 @@ def deal_with_url( url ):
             match = re.search(r'/([^/]*)$', st)
             if match:
                 filename = match.group(1)
-            match = re.search(r'/([^/]*)$', url)
-            if match:
-                html_url = match.group(1)
-            print(html_url)
+            print(commit)
             print(filename)
             if has_test_case(st) == False:
                 file = file + 1 
@@ -88,7 +135,7 @@ def deal_with_url( url ):
                 if (st.endswith(".java") == True): 
                     file_java = file_java + 1
                     # 如果不是test文件，就扫描仓库，找一下test文件
-                if get_test_files(prj, html_url, filename) ==True:   
+                if get_test_files(prj, commit, filename) ==True:   
                     isTest = 1
             else :
                 isTestcase = 1
@@ -142,10 +189,14 @@ def deal_with_url( url ):
     func = len(funcset)
 
 url='https://github.com/alibaba/fastjson/commit/f5903fa56497c00ed0703ac875b511f9bd5f1d8e'
-prj='alibaba/fastjson'   
-
 
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='统计一个提交的 file、func、hunk 并查找测试文件')
+    arg_parser.add_argument('--url', default=url, help='提交的 GitHub URL')
+    arg_parser.add_argument('--local-repo-base', default=local_repo_base, help='本地存放仓库克隆的目录（rs.py 的 --base-path），有克隆时不请求 GitHub')
+    args = arg_parser.parse_args()
+    local_repo_base = args.local_repo_base
         # 输出file,func,hunk
-deal_with_url(url + ".diff")
+    deal_with_url(args.url)
         
     
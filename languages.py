@@ -0,0 +1,189 @@
+import re
+from method_index import func_pattern
+
+# 代码中的非空白字符
+nonspace_pattern = re.compile(r'\S')
+
+def string_end_pattern(delimiter):
+    """
+    字符串或字符字面量从开头的分隔符之后到结尾分隔符的模式，跳过 \\ 转义。
+    三个字符的分隔符（多行字符串）中间可以出现单个或两个引号。
+    """
+    quote = re.escape(delimiter[0])
+    if len(delimiter) == 1:
+        return re.compile(rf'[^{quote}\\]*(?:\\.[^{quote}\\]*)*{quote}')
+    return re.compile(rf'[^{quote}\\]*(?:(?:\\.|{quote}(?!{quote}{quote}))[^{quote}\\]*)*{quote}{{3}}')
+
+class Language:
+    """
+    一种源码语言在 diff 解析中用到的规则。
+
+    DiffParser 按文件扩展名选出 Language，用 scan 逐行跟踪注释和字符串，判断修改行是否只改了注释，
+    用 import_marker 判断 import 行，extract_functions 用 method_pattern 找方法定义行。
+    同一次遍历中每个文件只在文件头查一次语言，之后的行直接使用这个文件的规则，语言再多也不会增加扫描次数。
+    """
+
+    def __init__(self, name, extensions, method_pattern, import_marker='import', line_comment='//', block_comment=('/*', '*/'),
+                 string_delimiters=('"""', '"', "'"), nested_comments=False):
+        """
+        参数:
+        - name: 语言名，--languages 中使用。
+        - extensions: 文件扩展名（不含点）。
+        - method_pattern: 方法定义行的正则，方法名和参数分别为 name 和 params 分组，需要与左花括号在同一行。
+        - import_marker: 含有这个字符串的修改行按 import 处理，不计入 hunk。
+        - line_comment: 单行注释的开头。
+        - block_comment: 多行注释的开头和结尾。
+        - string_delimiters: 字符串和字符字面量的分隔符，长的在前；三个字符的分隔符可以跨行（Java 文本块、Kotlin/Scala/Groovy 的多行字符串）。
+        - nested_comments: 多行注释是否可以嵌套（Scala）。
+        """
+        self.name = name
+        self.extensions = tuple(extensions)
+        self.method_pattern = method_pattern
+        self.import_marker = import_marker
+        self.line_comment = line_comment
+        self.block_start, self.block_end = block_comment
+        self.string_delimiters = tuple(string_delimiters)
+        self.nested_comments = nested_comments
+        # 代码中需要改变状态的记号：注释开头和字符串的开头分隔符
+        self.token_pattern = re.compile('|'.join(re.escape(token) for token in (line_comment, self.block_start) + self.string_delimiters))
+        self.comment_token_pattern = re.compile(re.escape(self.block_start) + '|' + re.escape(self.block_end))
+        self.string_end_patterns = [string_end_pattern(delimiter) for delimiter in self.string_delimiters]
+
+    def scan(self, line, state=0, start=0):
+        """
+        从 start 开始扫描一行源码，跟踪多行注释、字符串和字符字面量，每个字符最多经过一次。
+
+        参数:
+        - line: 一行源码，可以带 diff 的 +/-/空格前缀，由 start 跳过。
+        - state: 行首的状态，0 为代码，正数为多行注释的嵌套层数，负数为未结束的多行字符串（-1 - 分隔符的序号）。
+        - start: 开始扫描的位置。
+
+        返回:
+        - (行尾的状态, 这一行在注释之外是否有非空白的内容)。字符串和字符字面量算作代码，
+          所以 "/*" 或 "//" 写在字符串里时不会被当作注释，注释里的引号也不会开始字符串。
+        """
+        length = len(line)
+        i = start
+        has_code = False
+        while i < length:
+            if state > 0:
+                if self.nested_comments:
+                    match = self.comment_token_pattern.search(line, i)
+                    if match is None:
+                        return state, has_code
+                    state += 1 if match.group() == self.block_start else -1
+                    i = match.end()
+                    continue
+                end = line.find(self.block_end, i)
+                if end == -1:
+                    return state, has_code
+                state = 0
+                i = end + len(self.block_end)
+                continue
+            if state < 0:
+                match = self.string_end_patterns[-1 - state].match(line, i)
+                if match is None:
+                    return state, True
+                state = 0
+                has_code = True
+                i = match.end()
+                continue
+            match = self.token_pattern.search(line, i)
+            end = match.start() if match is not None else length
+            if not has_code and nonspace_pattern.search(line, i, end) is not None:
+                has_code = True
+            if match is None:
+                return 0, has_code
+            token = match.group()
+            if token == self.line_comment:
+                return 0, has_code
+            i = match.end()
+            if token == self.block_start:
+                state = 1
+                continue
+            has_code = True
+            number = self.string_delimiters.index(token)
+            match = self.string_end_patterns[number].match(line, i)
+            if match is not None:
+                i = match.end()
+            elif len(token) > 1:
+                return -1 - number, True
+            else:
+                # 没有结束的单行字符串，到行尾为止
+                return 0, True
+        return state, has_code
+
+    def __repr__(self):
+        return f'Language({self.name!r})'
+
+java = Language('java', ['java'], func_pattern)
+
+kotlin = Language('kotlin', ['kt', 'kts'], re.compile(
+    r'^\s*(?:(?:public|private|protected|internal|override|open|abstract|final|suspend|inline|operator|infix|tailrec|external)\s+)*'
+    r'fun\s+(?:<[^>]*>\s*)?(?:[\w.]+\.)?(?P<name>\w+)\s*\((?P<params>[^)]*)\)[^{=]*{'))
+
+scala = Language('scala', ['scala', 'sc'], re.compile(
+    r'^\s*(?:(?:private|protected|override|final|implicit|abstract|inline)(?:\[\w+\])?\s+)*'
+    r'def\s+(?P<name>\w+)\s*(?:\[[^\]]*\])?\s*\((?P<params>[^)]*)\)[^{=]*(?:=\s*)?{'), nested_comments=True)
+
+groovy = Language('groovy', ['groovy', 'gvy'], re.compile(
+    r'^\s*(?:(?:public|private|protected|static|final|synchronized|abstract)\s+)*(?:def|[\w<>\[\],.]+)\s+'
+    r'(?P<name>\w+)\s*\((?P<params>[^)]*)\)\s*(?:throws\s+[\w.]+(?:\s*,\s*[\w.]+)*)?\s*{'),
+    string_delimiters=('"""', "'''", '"', "'"))
+
+c = Language('c', ['c', 'h'], re.compile(
+    r'^\s*(?:(?:static|inline|extern|const|unsigned|signed|struct|enum|union|volatile)\s+)*[\w*]+[\s*]+'
+    r'(?P<name>\w+)\s*\((?P<params>[^)]*)\)\s*{'), import_marker='#include', string_delimiters=('"', "'"))
+
+# 扩展名 -> Language
+registry = {}
+
+def register(language):
+    """注册一种语言，扩展名与已有的语言相同时覆盖。"""
+    for extension in language.extensions:
+        registry[extension] = language
+
+for _language in (java, kotlin, scala, groovy, c):
+    register(_language)
+
+# 参与统计的语言，默认只有 Java，与之前的指标一致
+enabled = {'java'}
+
+def get_names():
+    """所有已注册的语言名。"""
+    return sorted({language.name for language in registry.values()})
+
+def set_enabled(names):
+    """
+    设置参与统计的语言。
+
+    参数:
+    - names: 语言名列表，例如 ['java', 'kotlin']。
+
+    返回:
+    - 不认识的语言名列表，这些名字被忽略。
+    """
+    known = set(get_names())
+    enabled.clear()
+    enabled.update(name for name in names if name in known)
+    return [name for name in names if name not in known]
+
+def enabled_key():
+    """启用的语言组成的字符串，用于缓存键，默认为 'java'。"""
+    return '+'.join(sorted(enabled))
+
+def get_language(path):
+    """
+    根据扩展名取得文件的语言。
+
+    参数:
+    - path: 文件路径，也可以是 "diff --git a/... b/..." 文件头（按行尾的扩展名判断）。
+
+    返回:
+    - Language，扩展名未注册或语言没有启用时返回 None。
+    """
+    _, dot, extension = path.rpartition('.')
+    if not dot:
+        return None
+    language = registry.get(extension)
+    return language if language is not None and language.name in enabled else None
@@ -0,0 +1,140 @@
+import re
+import bisect
+import threading
+from collections import OrderedDict
+
+# Java 的方法定义行，需要与左花括号在同一行；其他语言的模式见 languages.py，都使用 name 和 params 分组
+func_pattern = re.compile(r'^\s*(public|private|protected)?\s*(static)?\s*[\w<>\[\]]+\s+(?P<name>\w+)\s*\((?P<params>[^)]*)\)\s*(throws\s+\w+(?:\s*,\s*\w+)*)?\s*{')
+
+# 会被 func_pattern 误认为方法名的控制语句，例如 "else if (x) {"
+control_keywords = {'if', 'for', 'while', 'switch', 'catch', 'synchronized', 'return', 'new', 'else', 'try'}
+
+def count_braces(line, in_comment):
+    """
+    统计一行中代码部分的花括号，跳过字符串、字符字面量和注释。
+
+    参数:
+    - line: 一行源码。
+    - in_comment: 行首是否处于 /* */ 注释中。
+
+    返回:
+    - (花括号位置列表 [(列, 1 或 -1)], 行尾是否仍处于注释中)
+    """
+    braces = []
+    i = 0
+    length = len(line)
+    while i < length:
+        c = line[i]
+        if in_comment:
+            end = line.find('*/', i)
+            if end == -1:
+                return braces, True
+            in_comment = False
+            i = end + 2
+            continue
+        if c == '/' and i + 1 < length:
+            if line[i + 1] == '/':
+                break
+            if line[i + 1] == '*':
+                in_comment = True
+                i += 2
+                continue
+        if c == '"' or c == "'":
+            i += 1
+            while i < length and line[i] != c:
+                i += 2 if line[i] == '\\' else 1
+        elif c == '{':
+            braces.append((i, 1))
+        elif c == '}':
+            braces.append((i, -1))
+        i += 1
+    return braces, in_comment
+
+class MethodIndex:
+    """
+    一个文件的方法范围索引。
+
+    建立时按花括号深度找出每个方法从定义行到对应右花括号的范围，
+    保存为按起始行排序的数组，之后每个修改范围通过二分查找得到与它重叠的方法。
+    """
+
+    def __init__(self, lines, pattern=func_pattern):
+        """
+        参数:
+        - lines: 文件内容的行列表，行号从 1 开始对应 lines[0]。
+        - pattern: 方法定义行的正则，默认为 Java 的 func_pattern。
+        """
+        spans = []
+        stack = []  # 尚未结束的方法 (起始行, 签名, 定义行所在的深度)
+        depth = 0
+        in_comment = False
+        for number, line in enumerate(lines, start=1):
+            match = None if in_comment else pattern.match(line)
+            if match and match.group('name') not in control_keywords:
+                stack.append((number, f"{match.group('name')}({match.group('params')})", depth))
+            braces, in_comment = count_braces(line, in_comment)
+            for _, step in braces:
+                depth += step
+                if step < 0 and stack and depth <= stack[-1][2]:
+                    start, signature, _ = stack.pop()
+                    spans.append((start, number, signature))
+        for start, signature, _ in stack:
+            spans.append((start, len(lines), signature))
+        spans.sort()
+
+        self.starts = [span[0] for span in spans]
+        self.ends = [span[1] for span in spans]
+        self.signatures = [span[2] for span in spans]
+        # max_ends[i] 为前 i+1 个方法的最大结束行，用于向前查找包含起始行的方法
+        self.max_ends = []
+        current = 0
+        for end in self.ends:
+            current = max(current, end)
+            self.max_ends.append(current)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def lookup(self, start_line, end_line):
+        """
+        查找与修改范围重叠的方法，包括包含这个范围的方法和在范围内定义的方法。
+
+        参数:
+        - start_line: 起始行号。
+        - end_line: 结束行号，小于起始行（纯删除的 hunk）时按起始行处理。
+
+        返回:
+        - 方法签名列表，按定义行排序。
+        """
+        end_line = max(end_line, start_line)
+        right = bisect.bisect_right(self.starts, end_line)
+        left = bisect.bisect_left(self.starts, start_line)
+        enclosing = []
+        i = left - 1
+        while i >= 0 and self.max_ends[i] >= start_line:
+            if self.ends[i] >= start_line:
+                enclosing.append(self.signatures[i])
+            i -= 1
+        enclosing.reverse()
+        return enclosing + self.signatures[left:right]
+
+# 按 blob 哈希缓存的索引，不同提交中没有变化的文件共用同一个索引
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+index_cache_size = 4096
+
+def get_cached_index(blob_sha):
+    """返回 blob 对应的索引，不存在时返回 None。"""
+    with _index_cache_lock:
+        index = _index_cache.get(blob_sha)
+        if index is not None:
+            _index_cache.move_to_end(blob_sha)
+        return index
+
+def put_cached_index(blob_sha, index):
+    """保存 blob 的索引，超过 index_cache_size 时淘汰最久未用的索引。"""
+    with _index_cache_lock:
+        _index_cache[blob_sha] = index
+        _index_cache.move_to_end(blob_sha)
+        while len(_index_cache) > index_cache_size:
+            _index_cache.popitem(last=False)
@@ -0,0 +1,107 @@
+import os
+import glob
+import subprocess
+
+# 同一个项目的不同仓库名（改名、fork 到不同组织等），映射到同一个项目族
+# 没有登记的仓库以自己的 owner/repo（不区分大小写）作为项目族，不与其他仓库共享对象：
+# 只按仓库名判断会把 x/core 和 y/core 这样无关的同名仓库连在一起
+mirror_families = {
+    'apache/xmlgraphics-batik': 'batik',
+    'apache/batik': 'batik',
+}
+
+# 以小写仓库名为键的 mirror_families，导入时规范化一次
+_families = {name.lower(): family for name, family in mirror_families.items()}
+
+# 本次运行中已经为查找短哈希更新过所有分支的镜像路径
+fetched_branches = set()
+
+def get_family(repository_name):
+    """
+    返回仓库所属的项目族，同一族的镜像之间通过 alternates 共享对象。
+
+    参数:
+    - repository_name: owner/repo 形式的仓库名。
+    """
+    return _families.get(repository_name.lower(), repository_name.lower())
+
+def get_mirror_path(base_path, repository_name):
+    """
+    返回仓库的裸镜像路径 <base_path>/mirrors/<owner>/<repo>.git，以完整的 owner/repo 为键，不会重名。
+    """
+    owner, repo = repository_name.split('/')
+    return os.path.join(base_path, 'mirrors', owner, repo + '.git')
+
+def find_reference(base_path, repository_name):
+    """
+    在已有的镜像中找到同一项目族的另一个仓库，作为新镜像的对象来源。
+
+    返回:
+    - 镜像路径，没有时返回 None。
+    """
+    family = get_family(repository_name)
+    for path in sorted(glob.glob(os.path.join(base_path, 'mirrors', '*', '*.git'))):
+        owner = os.path.basename(os.path.dirname(path))
+        name = f"{owner}/{os.path.basename(path)[:-len('.git')]}"
+        if name.lower() != repository_name.lower() and get_family(name) == family:
+            return path
+    return None
+
+def missing_commits(mirror_path, commits):
+    """
+    用一次 git cat-file --batch-check 找出镜像中还没有的提交。
+
+    git 失败（例如镜像损坏或只创建了一半）时所有提交都算缺少，没有对应输出行的提交也算缺少。
+    """
+    commits = list(dict.fromkeys(commits))
+    result = subprocess.run(['git', '--git-dir', mirror_path, 'cat-file', '--batch-check'],
+                            input=''.join(f'{commit}^{{commit}}\n' for commit in commits),
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"git cat-file failed in {mirror_path}: {result.stderr.strip()}")
+        return commits
+    lines = result.stdout.splitlines()
+    return [commit for index, commit in enumerate(commits)
+            if index >= len(lines) or lines[index].split()[1:2] != ['commit']]
+
+def plan_mirror(base_path, repository_name, repository_url, commits=()):
+    """
+    计算让 owner/repo 的裸镜像存在并包含指定提交还需要执行的 git 命令。
+
+    参数:
+    - base_path: 本地存放仓库的目录。
+    - repository_name: owner/repo 形式的仓库名。
+    - repository_url: 远程仓库地址。
+    - commits: 需要的提交哈希，镜像的分支中没有时单独 fetch 到 refs/fw/<hash>；短哈希只能通过更新分支获取。
+
+    返回:
+    - 命令列表，镜像已经完整时为空。镜像不存在时只返回克隆命令，克隆完成后需要再次调用。
+
+    新镜像以同一项目族中已有的镜像为 --reference，对象通过 objects/info/alternates 共享，
+    只下载这个仓库独有的对象。被引用的镜像不能删除。
+    """
+    mirror_path = get_mirror_path(base_path, repository_name)
+    if not os.path.exists(mirror_path):
+        os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+        command = ['git', 'clone', '--bare', '--no-tags']
+        reference = find_reference(base_path, repository_name)
+        if reference is not None:
+            print(f"Sharing objects of {repository_name} with {reference}")
+            command += ['--reference-if-able', reference]
+        return [command + [repository_url, mirror_path]]
+
+    missing = missing_commits(mirror_path, commits)
+    # 短哈希不能写在 refspec 中，改为更新所有分支后在镜像中查找，每次运行每个镜像只更新一次
+    short = [commit for commit in missing if len(commit) < 40]
+    missing = [commit for commit in missing if len(commit) == 40]
+    refspecs = [f'{commit}:refs/fw/{commit}' for commit in missing]
+    if short:
+        if mirror_path in fetched_branches:
+            print(f"Commits {', '.join(short)} not found on any branch of {repository_name}, skipping")
+        else:
+            fetched_branches.add(mirror_path)
+            refspecs.append('+refs/heads/*:refs/heads/*')
+    if not refspecs:
+        print(f"Mirror {repository_name} already has all commits")
+        return []
+    return [['git', '-C', mirror_path, 'fetch', '--no-tags', 'origin'] + refspecs]
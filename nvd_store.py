@@ -0,0 +1,293 @@
+import os
+import gzip
+import json
+import sqlite3
+import argparse
+import threading
+import requests
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+import http_client
+from http_client import get_client
+
+# NVD CVE API 2.0 的地址，离线测试时可以改成本地的替身服务
+nvd_base_url = 'https://services.nvd.nist.gov/rest/json/cves/2.0'
+
+# 每页最多返回的记录数（NVD 的上限为 2000）
+results_per_page = 2000
+
+# 按最后修改时间查询时，NVD 要求一次的时间范围不超过 120 天
+max_range_days = 120
+
+# 有 API key 时的请求速率 (每秒请求数, 突发数)，NVD 限制为 30 秒 50 次；
+# 没有 key 时使用 http_client.host_rates 中的 30 秒 5 次
+api_key_rate = (50 / 30, 50)
+
+def parse_nvd_time(value):
+    """把 NVD 的时间字符串（可能没有时区）转换成 UTC 时间。"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def format_nvd_time(value):
+    """把 UTC 时间转换成 NVD 查询参数使用的格式。"""
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000+00:00')
+
+class NvdStore:
+    """
+    以 CVE 编号为键的本地 NVD 记录库（SQLite）。
+
+    记录来自批量下载（按最后修改时间分页查询）或本地的 JSON 文件，
+    查询时直接从库中读取，不再为每个 CVE 请求一次 NVD。
+    每条记录保存 NVD 返回的 vulnerabilities 中的一项，并按 lastModified 判断是否需要更新。
+    """
+
+    def __init__(self, path, base_url=None, api_key=None, client=None):
+        """
+        参数:
+        - path: SQLite 文件路径。
+        - base_url: NVD API 地址，为 None 时使用 nvd_base_url。
+        - api_key: NVD API key，有 key 时请求频率限制更宽松。
+        - client: 发送请求的 HttpClient，为 None 时使用进程共享的客户端。
+        """
+        self.path = path
+        self.base_url = base_url or nvd_base_url
+        self.api_key = api_key
+        self.client = client or get_client()
+        if api_key:
+            self.client.set_rate(urlparse(self.base_url).netloc, *api_key_rate)
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS cves (
+                id TEXT PRIMARY KEY,
+                last_modified TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        ''')
+        self.conn.commit()
+
+    def put_items(self, items):
+        """
+        保存 NVD 返回的 vulnerabilities 列表，只写入新增或 lastModified 比库中更新的记录，
+        导入较早的文件时不会覆盖已经下载的新记录。
+
+        返回:
+        - 写入的记录数。
+        """
+        changed = 0
+        with self.lock:
+            for item in items:
+                cve = item.get('cve', {})
+                cve_id = cve.get('id')
+                if not cve_id:
+                    continue
+                last_modified = cve.get('lastModified', '')
+                found = self.conn.execute('SELECT last_modified FROM cves WHERE id=?', (cve_id,)).fetchone()
+                if found is not None and found[0] >= last_modified:
+                    continue
+                self.conn.execute('INSERT OR REPLACE INTO cves VALUES (?, ?, ?)',
+                                  (cve_id, last_modified, json.dumps(item, ensure_ascii=False)))
+                changed += 1
+            self.conn.commit()
+        return changed
+
+    def load_feed(self, path):
+        """
+        从本地文件导入记录。
+
+        参数:
+        - path: NVD API 2.0 格式的 JSON 文件（含 vulnerabilities 列表），可以用 gzip 压缩。
+
+        返回:
+        - 写入的记录数。
+
+        文件带有 timestamp 时，上次同步的时间改为文件的生成时间（取较早的一个），
+        之后的 refresh 只下载文件生成之后修改过的记录，而不是全部记录。
+        """
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        changed = self.put_items(data.get('vulnerabilities', []))
+        if data.get('timestamp'):
+            generated = parse_nvd_time(data['timestamp'])
+            last_sync = self.get_meta('last_sync')
+            if last_sync is None or generated < parse_nvd_time(last_sync):
+                self.set_meta('last_sync', format_nvd_time(generated))
+        print(f"Loaded {path}: {changed} records changed")
+        return changed
+
+    def request(self, params):
+        """
+        请求一页 NVD API，请求速率由共享客户端的令牌桶控制。
+
+        返回:
+        - 解析后的 JSON，失败时返回 None。
+        """
+        headers = {'apiKey': self.api_key} if self.api_key else {}
+        # 分页结果已经保存在库中，不再放入 HTTP 缓存
+        use_cache = 'cveId' in params
+        try:
+            response = self.client.get(self.base_url, params=params, headers=headers, use_cache=use_cache)
+        except requests.RequestException as e:
+            print(f"Request {params} failed: {e}")
+            return None
+        if response.status_code != 200:
+            print(f"Request {params} failed with status code: {response.status_code}")
+            return None
+        return response.json()
+
+    def fetch_pages(self, params):
+        """
+        按 startIndex 翻页下载一个查询的全部结果并保存。
+
+        返回:
+        - 写入的记录数，中途失败时返回 None。
+        """
+        changed = 0
+        start_index = 0
+        while True:
+            page = self.request(dict(params, resultsPerPage=results_per_page, startIndex=start_index))
+            if page is None:
+                return None
+            items = page.get('vulnerabilities', [])
+            changed += self.put_items(items)
+            start_index += len(items)
+            total = page.get('totalResults', 0)
+            print(f"Fetched {start_index}/{total} records")
+            if not items or start_index >= total:
+                return changed
+
+    def refresh(self, since=None):
+        """
+        下载上次同步之后修改过的记录。
+
+        参数:
+        - since: 起始时间（datetime），为 None 时使用上次同步的时间；从未同步过时下载全部记录。
+
+        返回:
+        - 写入的记录数，失败时返回 None（同步时间不变，下次从同一位置重新开始）。
+        """
+        now = datetime.now(timezone.utc)
+        if since is None:
+            since = self.get_meta('last_sync')
+            since = parse_nvd_time(since) if since else None
+
+        if since is None:
+            changed = self.fetch_pages({})
+        else:
+            changed = 0
+            start = since
+            while start < now:
+                end = min(now, start + timedelta(days=max_range_days))
+                result = self.fetch_pages({'lastModStartDate': format_nvd_time(start),
+                                           'lastModEndDate': format_nvd_time(end)})
+                if result is None:
+                    return None
+                changed += result
+                start = end
+
+        if changed is not None:
+            self.set_meta('last_sync', format_nvd_time(now))
+        return changed
+
+    def sync(self, feeds=()):
+        """
+        批量补齐记录：先导入本地文件，再下载上次同步（或文件生成）之后修改过的记录。
+        查询前先调用，resolve 只需要为剩下的少数 CVE 单独请求。
+
+        参数:
+        - feeds: 本地 JSON 文件路径列表，见 load_feed。
+
+        返回:
+        - 下载时写入的记录数，失败时返回 None。
+        """
+        for feed in feeds:
+            self.load_feed(feed)
+        return self.refresh()
+
+    def resolve(self, cve_ids):
+        """
+        确保指定的 CVE 都在库中，不在库中的逐个按 cveId 请求。
+        只作为批量同步（sync）之后的补充，例如刚发布、还没有同步到的 CVE。
+
+        返回:
+        - 仍然找不到的 CVE 编号列表。
+        """
+        missing = [cve_id for cve_id in dict.fromkeys(cve_ids) if self.get_item(cve_id) is None]
+        if missing:
+            print(f"Fetching {len(missing)} CVEs not in {self.path}")
+        not_found = []
+        for cve_id in missing:
+            page = self.request({'cveId': cve_id})
+            if page is not None:
+                self.put_items(page.get('vulnerabilities', []))
+            if self.get_item(cve_id) is None:
+                not_found.append(cve_id)
+        return not_found
+
+    def get_item(self, cve_id):
+        """返回库中保存的一条记录（vulnerabilities 中的一项），不存在时返回 None。"""
+        with self.lock:
+            found = self.conn.execute('SELECT data FROM cves WHERE id=?', (cve_id,)).fetchone()
+        return json.loads(found[0]) if found is not None else None
+
+    def get_response(self, cve_id):
+        """
+        以 NVD API 按 cveId 查询的响应格式返回一条记录，
+        可以直接交给 extract_cwe_repo_commit_urls / find_cwe_from_json 处理。
+
+        返回:
+        - {'vulnerabilities': [记录], ...}，不存在时返回 None。
+        """
+        item = self.get_item(cve_id)
+        if item is None:
+            return None
+        return {'resultsPerPage': 1, 'startIndex': 0, 'totalResults': 1,
+                'format': 'NVD_CVE', 'version': '2.0', 'vulnerabilities': [item]}
+
+    def get_meta(self, key):
+        with self.lock:
+            found = self.conn.execute('SELECT value FROM meta WHERE key=?', (key,)).fetchone()
+        return found[0] if found is not None else None
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='维护本地的 NVD 记录库')
+    parser.add_argument('--db', default='nvd_cache.sqlite', help='SQLite 文件路径')
+    parser.add_argument('--feed', action='append', default=[], help='导入本地 JSON 文件，可以指定多次')
+    parser.add_argument('--refresh', action='store_true', help='下载上次同步之后修改过的记录')
+    parser.add_argument('--since', help='从这个时间开始同步，例如 2024-01-01T00:00:00')
+    parser.add_argument('--base-url', default=None, help='NVD API 地址')
+    parser.add_argument('--api-key', default=os.environ.get('NVD_API_KEY'), help='NVD API key')
+    parser.add_argument('--http-cache', default=None, help='HTTP 缓存目录，按 ETag/Last-Modified 做条件请求')
+    parser.add_argument('cve_ids', nargs='*', help='需要确保在库中的 CVE 编号')
+    args = parser.parse_args()
+    http_client.http_cache_dir = args.http_cache
+
+    store = NvdStore(args.db, args.base_url, args.api_key)
+    for feed in args.feed:
+        store.load_feed(feed)
+    if args.refresh or args.since:
+        store.refresh(parse_nvd_time(args.since) if args.since else None)
+    if args.cve_ids:
+        not_found = store.resolve(args.cve_ids)
+        for cve_id in not_found:
+            print(f"{cve_id} not found")
+    store.close()
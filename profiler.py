@@ -0,0 +1,223 @@
+import io
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+import contextlib
+
+# 为 True 时记录每个提交各阶段的耗时，为 False 时 task / stage / add 都不做任何事
+enabled = False
+
+# 每个阶段累计的指标
+stage_fields = ('wall', 'cpu', 'calls', 'bytes', 'subprocesses')
+
+_local = threading.local()
+_records = []
+_records_lock = threading.Lock()
+
+class TaskProfile:
+    """一个提交（或一批克隆）的各阶段指标和 Chrome trace 事件。"""
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.stages = {}
+        self.frames = []
+        self.events = []
+
+    def push(self, name):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = dict.fromkeys(stage_fields, 0)
+        # [阶段, 开始时间, 开始 CPU 时间, 开始的时间戳, 子阶段的耗时, 子阶段的 CPU 时间]
+        self.frames.append([entry, time.perf_counter(), time.thread_time(), time.time(), 0.0, 0.0])
+
+    def pop(self, name):
+        entry, start, start_cpu, timestamp, child_wall, child_cpu = self.frames.pop()
+        wall = time.perf_counter() - start
+        cpu = time.thread_time() - start_cpu
+        # 各阶段只记自身的时间，子阶段（例如解析时等待 git diff 输出）的时间不重复计入
+        entry['wall'] += wall - child_wall
+        entry['cpu'] += cpu - child_cpu
+        entry['calls'] += 1
+        if self.frames:
+            self.frames[-1][4] += wall
+            self.frames[-1][5] += cpu
+        self.events.append((name, timestamp, wall))
+
+    def to_record(self, wall, cpu):
+        # 不在任何阶段中的时间（打印、组装结果等）
+        self.stages['other'] = dict.fromkeys(stage_fields, 0)
+        self.stages['other']['wall'] = max(0.0, wall - sum(entry['wall'] for entry in self.stages.values()))
+        self.stages['other']['cpu'] = max(0.0, cpu - sum(entry['cpu'] for entry in self.stages.values()))
+        return {'kind': self.kind, 'name': self.name, 'pid': os.getpid(), 'tid': threading.get_ident(),
+                'start': self.start, 'wall': wall, 'cpu': cpu, 'stages': self.stages,
+                'events': [[name, timestamp, duration] for name, timestamp, duration in self.events]}
+
+@contextlib.contextmanager
+def task(name, kind='commit'):
+    """
+    记录一个任务（一个提交的分析或一批克隆），在同一线程中执行的 stage 都计入这个任务。
+
+    参数:
+    - name: 任务名，提交的 URL。
+    - kind: 'commit' 或 'clone'。
+    """
+    if not enabled:
+        yield
+        return
+    profile = _local.profile = TaskProfile(name, kind)
+    start, start_cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        _local.profile = None
+        record = profile.to_record(time.perf_counter() - start, time.thread_time() - start_cpu)
+        with _records_lock:
+            _records.append(record)
+
+@contextlib.contextmanager
+def stage(name):
+    """记录当前任务中的一个阶段，不在任务中时不记录。"""
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        yield
+        return
+    profile.push(name)
+    try:
+        yield
+    finally:
+        profile.pop(name)
+
+def add(counter, value=1):
+    """给当前阶段的计数器（bytes 或 subprocesses）加上 value，不在阶段中时忽略。"""
+    profile = getattr(_local, 'profile', None)
+    if profile is not None and profile.frames:
+        profile.frames[-1][0][counter] += value
+
+def drain():
+    """取出当前进程中已经完成的任务记录，worker 把它们随结果一起返回给主进程。"""
+    with _records_lock:
+        records = _records[:]
+        del _records[:]
+    return records
+
+class TimedReader(io.RawIOBase):
+    """
+    包装子进程的输出管道，读取时阻塞的时间计入 name 阶段，并统计读取的字节数。
+
+    在外面再套一层 io.BufferedReader，每次读取一整块而不是一行，计时的开销可以忽略。
+    """
+
+    def __init__(self, raw, name):
+        self.raw = raw
+        self.name = name
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        with stage(self.name):
+            size = self.raw.readinto(buffer)
+            add('bytes', size or 0)
+        return size
+
+def wrap_pipe(pipe, name, buffer_size=65536):
+    """分析时开启了计时就返回计时的读取器，否则原样返回 pipe。"""
+    if getattr(_local, 'profile', None) is None:
+        return pipe
+    return io.BufferedReader(TimedReader(pipe.raw, name), buffer_size)
+
+class ProfileWriter:
+    """
+    把任务记录写成 JSON lines（每行一个任务，不含 trace 事件）和/或 Chrome trace
+    （chrome://tracing 或 https://ui.perfetto.dev 可以打开）。
+    """
+
+    def __init__(self, jsonl_path=None, trace_path=None):
+        self.jsonl = open(jsonl_path, 'w', encoding='utf-8') if jsonl_path else None
+        self.trace = open(trace_path, 'w', encoding='utf-8') if trace_path else None
+        self.separator = '[\n'
+
+    def write(self, records):
+        for record in records:
+            if self.jsonl is not None:
+                self.jsonl.write(json.dumps({key: value for key, value in record.items() if key != 'events'}) + '\n')
+            if self.trace is not None:
+                for name, timestamp, duration in record['events']:
+                    event = {'name': name, 'cat': record['kind'], 'ph': 'X', 'ts': int(timestamp * 1e6),
+                             'dur': int(duration * 1e6), 'pid': record['pid'], 'tid': record['tid'],
+                             'args': {'task': record['name']}}
+                    self.trace.write(self.separator + json.dumps(event))
+                    self.separator = ',\n'
+        if self.jsonl is not None:
+            self.jsonl.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.jsonl is not None:
+            self.jsonl.close()
+        if self.trace is not None:
+            self.trace.write('[]\n' if self.separator == '[\n' else '\n]\n')
+            self.trace.close()
+
+def percentile(values, q):
+    """有序序列的 q 分位数（最近秩法）。"""
+    index = max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))
+    return values[index]
+
+def load_records(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def summarize(records, top=10):
+    """
+    打印每个阶段的 p50/p95/p99 耗时、CPU 时间、读取的字节数和子进程数，以及最慢的提交。
+    """
+    commits = [record for record in records if record['kind'] == 'commit']
+    clones = [record for record in records if record['kind'] == 'clone']
+    total_wall = sum(record['wall'] for record in commits) or 1e-9
+    names = sorted({name for record in commits for name in record['stages']},
+                   key=lambda name: -sum(record['stages'].get(name, {}).get('wall', 0) for record in commits))
+
+    print(f"{len(commits)} commits, {total_wall:.1f}s analysis wall time"
+          + (f", {len(clones)} clone batches, {sum(r['wall'] for r in clones):.1f}s cloning" if clones else ''))
+    print(f"{'stage':<20}{'commits':>8}{'share':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'cpu/wall':>10}{'MB':>10}{'procs':>8}")
+    for name in names:
+        present = [record['stages'][name] for record in commits if name in record['stages']]
+        walls = sorted(entry['wall'] for entry in present)
+        wall = sum(walls)
+        cpu = sum(entry['cpu'] for entry in present)
+        print(f"{name:<20}{len(present):>8}{wall / total_wall:>8.1%}"
+              f"{percentile(walls, 0.5) * 1000:>10.1f}{percentile(walls, 0.95) * 1000:>10.1f}{percentile(walls, 0.99) * 1000:>10.1f}"
+              f"{cpu / wall if wall else 0:>10.2f}{sum(entry['bytes'] for entry in present) / 1024 ** 2:>10.1f}"
+              f"{sum(entry['subprocesses'] for entry in present):>8}")
+    walls = sorted(record['wall'] for record in commits)
+    if walls:
+        print(f"{'(whole commit)':<20}{len(walls):>8}{1:>8.1%}{percentile(walls, 0.5) * 1000:>10.1f}"
+              f"{percentile(walls, 0.95) * 1000:>10.1f}{percentile(walls, 0.99) * 1000:>10.1f}")
+
+    print(f"\nslowest {min(top, len(commits))} commits:")
+    for record in sorted(commits, key=lambda record: -record['wall'])[:top]:
+        slowest = max(record['stages'].items(), key=lambda item: item[1]['wall'], default=(None, None))
+        detail = f"{slowest[0]} {slowest[1]['wall'] * 1000:.0f} ms" if slowest[0] else ''
+        print(f"{record['wall'] * 1000:>10.0f} ms  {record['name']}  ({detail})")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='汇总 rs.py --profile 写出的各阶段耗时')
+    parser.add_argument('profile', help='rs.py --profile 写出的 JSON lines 文件')
+    parser.add_argument('--top', type=int, default=10, help='列出最慢的提交数')
+    args = parser.parse_args()
+    if not os.path.exists(args.profile):
+        print(f"{args.profile} not found")
+        sys.exit(1)
+    summarize(load_records(args.profile), args.top)
@@ -0,0 +1,412 @@
+import os
+import re
+import sys
+import csv
+import json
+import bisect
+import argparse
+from array import array
+from collections import Counter
+from input_reader import read_commits
+
+try:
+    import numpy
+except ImportError:  # 没有 numpy 时用纯 Python 计算汇总，结果相同
+    numpy = None
+
+# 列的顺序与 rs.output_header 一致，另外增加 cwe 列
+columns = ['url', 'repo', 'cwe', 'file', 'java_file', 'func', 'hunk', 'test', 'note']
+
+# 整数列，每列一个小端 int32 文件
+int_columns = ['file', 'java_file', 'func', 'hunk', 'test']
+
+# 字典编码的列：每行只保存 int32 编号，不同的取值只保存一次
+dict_columns = ['repo', 'cwe']
+
+# 文本列：int64 的结束偏移加上 UTF-8 内容
+text_columns = ['url', 'note']
+
+# 汇总时计算的分位数
+summary_quantiles = {'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+cwe_pattern = re.compile(r'CWE-\d+')
+
+def read_array(path, typecode, count):
+    """从文件读取 count 个小端整数。"""
+    values = array(typecode)
+    with open(path, 'rb') as f:
+        values.frombytes(f.read(count * values.itemsize))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def write_array(f, values):
+    """把整数数组以小端写入文件。"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(f)
+
+def quantile(values, start, end, q):
+    """
+    有序序列 values[start:end] 的 q 分位数，线性插值，与 numpy.percentile 的默认方法相同。
+    """
+    position = start + q * (end - start - 1)
+    low = int(position)
+    high = min(low + 1, end - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+class ResultsStore:
+    """
+    分析结果的列式存储。
+
+    一个目录保存一份结果，每列一个文件：
+    - file / java_file / func / hunk / test 为 int32；
+    - repo / cwe 为 int32 编号，取值保存在 <列名>.dict 中（每行一个 JSON 字符串）；
+    - url / note 为 int64 结束偏移（<列名>.offsets）和 UTF-8 内容（<列名>.utf8）。
+    meta.json 记录行数和每个文件的有效长度，每批追加完成后才更新；
+    中途崩溃时多写的部分在下次打开时截掉。
+    """
+
+    def __init__(self, path):
+        """
+        参数:
+        - path: 存储目录，不存在时创建。
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {'version': 1, 'rows': 0,
+                         'dict_sizes': {name: 0 for name in dict_columns},
+                         'text_bytes': {name: 0 for name in text_columns}}
+        self.rows = self.meta['rows']
+        self.dictionaries = {}
+        self.codes = {}
+        for name in dict_columns:
+            values = []
+            if os.path.exists(self.get_path(name, 'dict')):
+                with open(self.get_path(name, 'dict'), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if len(values) == self.meta['dict_sizes'][name]:
+                            break
+                        values.append(json.loads(line))
+            self.dictionaries[name] = values
+            self.codes[name] = {value: code for code, value in enumerate(values)}
+        self.recover()
+
+    def get_path(self, name, suffix):
+        return os.path.join(self.path, f'{name}.{suffix}')
+
+    def get_sizes(self):
+        """每个文件按 meta 应有的字节数（json.dumps 默认只输出 ASCII，字符数即字节数）。"""
+        sizes = {}
+        for name in int_columns + dict_columns:
+            sizes[self.get_path(name, 'i32')] = self.rows * 4
+        for name in text_columns:
+            sizes[self.get_path(name, 'offsets')] = self.rows * 8
+            sizes[self.get_path(name, 'utf8')] = self.meta['text_bytes'][name]
+        for name in dict_columns:
+            sizes[self.get_path(name, 'dict')] = sum(len(json.dumps(value)) + 1 for value in self.dictionaries[name])
+        return sizes
+
+    def recover(self):
+        """创建缺少的文件，截掉上次未完成的追加写入的内容。"""
+        for path, size in self.get_sizes().items():
+            with open(path, 'ab') as f:
+                if f.tell() > size:
+                    f.truncate(size)
+
+    def save_meta(self):
+        self.meta['rows'] = self.rows
+        self.meta['dict_sizes'] = {name: len(self.dictionaries[name]) for name in dict_columns}
+        with open(self.meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.meta_path + '.tmp', self.meta_path)
+
+    def append(self, rows, cwes=None):
+        """
+        追加一批结果。
+
+        参数:
+        - rows: rs.analyze_commit 返回的行，顺序为 url, repo, file, java_file, func, hunk, test, note。
+        - cwes: 与 rows 一一对应的 CWE 字符串列表，为 None 时 cwe 都为空字符串。
+        """
+        if not rows:
+            return
+        ints = {name: array('i') for name in int_columns + dict_columns}
+        texts = {name: [] for name in text_columns}
+        new_values = {name: [] for name in dict_columns}
+        for position, (url, repo, file, java_file, func, hunk, test, note) in enumerate(rows):
+            for name, value in (('file', file), ('java_file', java_file), ('func', func), ('hunk', hunk), ('test', test)):
+                ints[name].append(int(value))
+            for name, value in (('repo', repo), ('cwe', cwes[position] if cwes is not None else '')):
+                value = value or ''
+                code = self.codes[name].get(value)
+                if code is None:
+                    code = self.codes[name][value] = len(self.dictionaries[name])
+                    self.dictionaries[name].append(value)
+                    new_values[name].append(value)
+                ints[name].append(code)
+            texts['url'].append(url)
+            texts['note'].append(note or '')
+
+        for name in int_columns + dict_columns:
+            with open(self.get_path(name, 'i32'), 'ab') as f:
+                write_array(f, ints[name])
+        for name in dict_columns:
+            if new_values[name]:
+                with open(self.get_path(name, 'dict'), 'a', encoding='utf-8', newline='\n') as f:
+                    f.writelines(json.dumps(value) + '\n' for value in new_values[name])
+        for name in text_columns:
+            offsets = array('q')
+            end = self.meta['text_bytes'][name]
+            chunks = []
+            for text in texts[name]:
+                data = text.encode('utf-8')
+                chunks.append(data)
+                end += len(data)
+                offsets.append(end)
+            with open(self.get_path(name, 'utf8'), 'ab') as f:
+                f.write(b''.join(chunks))
+            with open(self.get_path(name, 'offsets'), 'ab') as f:
+                write_array(f, offsets)
+            self.meta['text_bytes'][name] = end
+        self.rows += len(rows)
+        self.save_meta()
+
+    def truncate(self, rows):
+        """只保留前 rows 行，用于与 --resume 截断后的输出 CSV 对齐。"""
+        if rows >= self.rows:
+            return
+        for name in text_columns:
+            self.meta['text_bytes'][name] = read_array(self.get_path(name, 'offsets'), 'q', rows)[-1] if rows else 0
+        self.rows = rows
+        self.save_meta()
+        self.recover()
+
+    def column(self, name):
+        """
+        读取一列。
+
+        返回:
+        - 整数列和字典编码列的编号：有 numpy 时为 numpy.ndarray，否则为 array('i')；
+        - 文本列：字符串列表。
+        """
+        if name in text_columns:
+            offsets = read_array(self.get_path(name, 'offsets'), 'q', self.rows)
+            with open(self.get_path(name, 'utf8'), 'rb') as f:
+                data = f.read(self.meta['text_bytes'][name])
+            texts = []
+            start = 0
+            for end in offsets:
+                texts.append(data[start:end].decode('utf-8'))
+                start = end
+            return texts
+        if numpy is not None:
+            return numpy.fromfile(self.get_path(name, 'i32'), dtype='<i4', count=self.rows)
+        return read_array(self.get_path(name, 'i32'), 'i', self.rows)
+
+    def iter_rows(self):
+        """按 columns 的顺序逐行返回，字典编码的列还原为字符串。"""
+        data = [self.column(name) for name in columns]
+        for i in range(self.rows):
+            row = []
+            for name, values in zip(columns, data):
+                value = values[i]
+                if name in dict_columns:
+                    value = self.dictionaries[name][value]
+                elif name in int_columns:
+                    value = int(value)
+                row.append(value)
+            yield row
+
+    def get_groups(self, by):
+        """
+        返回 (分组编号的列表, 分组名列表)，列表中的每一项与行一一对应，-1 表示该行不属于任何组。
+
+        按 cwe 分组时一行可以有多个 CWE（例如 "CWE-74CWE-113"），拆分只在字典上做一次，
+        一行有几个 CWE 就出现在几组中；没有 CWE 的行归入空字符串一组。
+        """
+        codes = self.column(by)
+        if by != 'cwe':
+            return [codes], list(self.dictionaries[by])
+        names = []
+        group_ids = {}
+        code_groups = []
+        for value in self.dictionaries[by]:
+            groups = []
+            for name in dict.fromkeys(cwe_pattern.findall(value)) or ['']:
+                if name not in group_ids:
+                    group_ids[name] = len(names)
+                    names.append(name)
+                groups.append(group_ids[name])
+            code_groups.append(groups)
+        layers = []
+        for layer in range(max((len(groups) for groups in code_groups), default=0)):
+            mapping = [groups[layer] if len(groups) > layer else -1 for groups in code_groups]
+            if numpy is not None:
+                layers.append(numpy.array(mapping, dtype='<i4')[codes])
+            else:
+                layers.append(array('i', (mapping[code] for code in codes)))
+        return layers, names
+
+    def summarize(self, by, value):
+        """
+        按 repo 或 cwe 分组汇总一个整数列。
+
+        参数:
+        - by: 'repo' 或 'cwe'。
+        - value: 整数列名，例如 'hunk'。
+
+        返回:
+        - {分组名: {'count', 'mean', 'min', 'p25', 'median', 'p75', 'p90', 'max', 'histogram'}}，
+          histogram 为 histogram_labels 中每个区间的行数。
+
+        有 numpy 时对整个数据集做一次排序和分段归约，否则逐组计算，两者结果相同。
+        """
+        layers, names = self.get_groups(by)
+        values = self.column(value)
+        if numpy is not None:
+            return summarize_numpy(layers, values, names)
+        return summarize_python(layers, values, names)
+
+# 直方图区间的下界和名称
+histogram_edges = [0, 1, 2, 3, 6, 11, 21]
+histogram_labels = ['0', '1', '2', '3-5', '6-10', '11-20', '21+']
+
+def summarize_numpy(layers, values, names):
+    keys = numpy.concatenate(layers) if layers else numpy.zeros(0, dtype='<i4')
+    values = numpy.tile(values, len(layers))
+    keep = keys >= 0
+    keys, values = keys[keep], values[keep].astype('f8')
+    if len(keys) == 0:
+        return {}
+    order = numpy.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    starts = numpy.flatnonzero(numpy.r_[True, keys[1:] != keys[:-1]])
+    ends = numpy.r_[starts[1:], len(keys)]
+    counts = ends - starts
+    stats = {'count': counts, 'mean': numpy.add.reduceat(values, starts) / counts,
+             'min': values[starts], 'max': values[ends - 1]}
+    for label, q in summary_quantiles.items():
+        position = starts + q * (counts - 1)
+        low = position.astype('i8')
+        high = numpy.minimum(low + 1, ends - 1)
+        stats[label] = values[low] + (values[high] - values[low]) * (position - low)
+    bins = numpy.searchsorted(histogram_edges, values, side='right') - 1
+    group_index = numpy.repeat(numpy.arange(len(starts)), counts)
+    histogram = numpy.bincount(group_index * len(histogram_edges) + bins,
+                               minlength=len(starts) * len(histogram_edges)).reshape(len(starts), -1)
+    result = {}
+    for i, key in enumerate(keys[starts]):
+        summary = {name: float(stats[name][i]) for name in ['mean', 'min'] + list(summary_quantiles) + ['max']}
+        summary['count'] = int(counts[i])
+        summary['histogram'] = histogram[i].tolist()
+        result[names[key]] = summary
+    return result
+
+def summarize_python(layers, values, names):
+    groups = {}
+    for keys in layers:
+        for key, value in zip(keys, values):
+            if key >= 0:
+                groups.setdefault(key, []).append(value)
+    result = {}
+    for key in sorted(groups):
+        group = sorted(groups[key])
+        summary = {'mean': sum(group) / len(group), 'min': float(group[0])}
+        for label, q in summary_quantiles.items():
+            summary[label] = float(quantile(group, 0, len(group), q))
+        summary['max'] = float(group[-1])
+        summary['count'] = len(group)
+        histogram = [0] * len(histogram_edges)
+        for value in group:
+            histogram[bisect.bisect_right(histogram_edges, value) - 1] += 1
+        summary['histogram'] = histogram
+        result[names[key]] = summary
+    return result
+
+def load_cwes(path):
+    """
+    从输入 CSV 中读取每个提交 URL 的 CWE，列的位置由 input_reader.read_commits 按表头或内容识别。
+
+    返回:
+    - url 到 CWE 列表的字典，按输入中出现的顺序；同一个 URL 在不同的 CWE 下出现多次时每行一项，没有 CWE 的行为空字符串。
+    """
+    cwes = {}
+    for commit in read_commits(path, dedup=False):
+        cwes.setdefault(commit.url, []).append(commit.cwe)
+    return cwes
+
+def match_cwes(rows, cwes, seen):
+    """
+    为一批输出行取出各自的 CWE：同一个 URL 的第 n 行对应输入中这个 URL 的第 n 个 CWE（输出按输入顺序写出），
+    输出比输入多的行沿用最后一个。
+
+    参数:
+    - cwes: load_cwes 的结果。
+    - seen: 每个 URL 已经取过的行数（Counter），跨批次累加。
+    """
+    matched = []
+    for row in rows:
+        values = cwes.get(row[0])
+        matched.append(values[min(seen[row[0]], len(values) - 1)] if values else '')
+        seen[row[0]] += 1
+    return matched
+
+def import_csv(store, path, cwes=None, batch_size=10000):
+    """
+    把已有的输出 CSV（a.csv 这样逗号分隔的，或 result.csv 这样制表符分隔的）导入存储。
+
+    返回:
+    - 导入的行数。
+    """
+    # 在 Windows 上用 Excel 另存过的文件可能不是 UTF-8，无法解码的字符替换掉
+    with open(path, newline='', encoding='utf-8', errors='replace') as f:
+        header = f.readline()
+        delimiter = '\t' if '\t' in header else ','
+        batch = []
+        count = 0
+        seen = Counter()
+        for row in csv.reader(f, delimiter=delimiter):
+            if len(row) < 8 or not row[0]:
+                continue
+            batch.append(row[:8])
+            if len(batch) >= batch_size:
+                store.append(batch, match_cwes(batch, cwes, seen) if cwes is not None else None)
+                count += len(batch)
+                batch = []
+        store.append(batch, match_cwes(batch, cwes, seen) if cwes is not None else None)
+        return count + len(batch)
+
+def print_summary(summary, by, value):
+    print(f"{by:<40}{'count':>8}{'mean':>9}{'min':>7}{'p25':>7}{'median':>8}{'p75':>7}{'p90':>7}{'max':>7}   {value} histogram ({' '.join(histogram_labels)})")
+    for name, stats in sorted(summary.items(), key=lambda item: -item[1]['count']):
+        print(f"{name or '-':<40}{stats['count']:>8}{stats['mean']:>9.2f}{stats['min']:>7.0f}{stats['p25']:>7.1f}"
+              f"{stats['median']:>8.1f}{stats['p75']:>7.1f}{stats['p90']:>7.1f}{stats['max']:>7.0f}   {stats['histogram']}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='分析结果的列式存储')
+    parser.add_argument('store', help='存储目录')
+    parser.add_argument('--import-csv', nargs='*', default=[], help='导入已有的输出 CSV（a.csv / result.csv）')
+    parser.add_argument('--cwe-input', help='导入时从这个输入 CSV（例如 java_repos.csv，格式同 rs.py 的输入）读取每个 URL 的 CWE')
+    parser.add_argument('--by', choices=dict_columns, default='cwe', help='分组的列')
+    parser.add_argument('--value', choices=int_columns, default='hunk', help='汇总的列')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出汇总')
+    args = parser.parse_args()
+
+    results = ResultsStore(args.store)
+    cwes = load_cwes(args.cwe_input) if args.cwe_input else None
+    for csv_path in args.import_csv:
+        print(f"Imported {import_csv(results, csv_path, cwes)} rows from {csv_path}")
+    summary = results.summarize(args.by, args.value)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_summary(summary, args.by, args.value)
@@ -1,10 +1,30 @@
+import io
 import os
-import requests
 import csv
 import re
-import time
+import zlib
+import hashlib
+import inspect
+import asyncio
+import argparse
+import functools
+import contextlib
+import multiprocessing
 import subprocess
-from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple, Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from git_batch import get_cat_file
+from diff_cache import DiffCache, DiffRecorder
+from mirror_store import plan_mirror, get_family, get_mirror_path
+from clone_async import CloneOrchestrator
+import method_index
+import http_client
+import profiler
+import languages
+import tree_index
+from results_store import ResultsStore
+from input_reader import read_commits
+from commit_index import CommitIndex, parse_commit_url, format_commit_url, fan_out
 
 # GitHub access token 用于访问私有仓库
 access_token = ''
@@ -18,35 +38,314 @@ input_csv = "E:\\task\\fw\\1.csv"
 # 输出的 CSV 文件路径
 output_csv = "E:\\task\\fw\\a.csv"
 
+# 克隆方式: 'full' 完整克隆，'blobless' / 'treeless' 为只获取所需提交的部分克隆，
+# 'mirror' 为 <base_path1>/mirrors/<owner>/<repo>.git 下的裸镜像，同一项目的 fork 之间共享对象
+clone_mode = 'full'
+
+# 部分克隆模式对应的 --filter 参数
+partial_clone_filters = {'blobless': 'blob:none', 'treeless': 'tree:0'}
+
+# 远程仓库地址前缀，为 None 时使用带 access_token 的 GitHub 地址；
+# 也可以设为 file:///path/to/bare/repos 之类的本地地址
+remote_base = None
+
+# diff 和分析结果的缓存文件，为 None 时不使用缓存
+cache_path = None
+
+# 缓存大小上限（字节）
+cache_max_bytes = 2 * 1024 ** 3
+
+# 为 True 时先用 git diff --name-status 统计文件数，再只取启用语言的源文件（包括测试文件）的 diff，
+# 资源和锁文件等其他文件的内容不再经过管道
+diff_filter = False
+
+# 为 True 时打印每个修改的源文件对应的测试文件（find_test_pairs），需要额外读取仓库的文件列表
+show_test_pairs = False
+
+# pathspec 的总长度超过这个值时改为取完整的 diff（Windows 的命令行长度限制为 32767）
+max_pathspec_chars = 30000
+
+# 本次运行中已经为查找短哈希获取过所有分支的本地仓库路径，找不到的短哈希不再重复获取
+fetched_branches = set()
+
+# 流式读取输入时每批提交数的上限；第一批只有 first_chunk_size 个，之后每批翻倍，
+# 第一个结果不必等整个输入读完和所有仓库克隆完
+chunk_size = 2000
+first_chunk_size = 16
+
+# 输出 CSV 的表头
+output_header = ['url', 'repo', 'file', 'java_file', 'func', 'hunk', 'test', 'note']
+
 # 定义正则表达式模式
-single_line_comment_pattern = re.compile(r'^[+-]?\s*//')
-multi_line_comment_start_pattern = re.compile(r'^[+-]?\s*/\*')
-multi_line_comment_cont_pattern = re.compile(r'^[+-]?\s*\*')
-empty_or_whitespace_pattern = re.compile(r'^\s*$')
+test_file_pattern = re.compile(r'^diff --git.*[Tt][Ee][Ss][Tt].*$')
+diff_file_pattern = re.compile(r'diff --git a/(.*?) b/\1')
+hunk_header_pattern = re.compile(r'@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+# 去掉 +/-/空格前缀后的空行，用 match(line, 1)
+blank_content_pattern = re.compile(r'\s*$')
+# 以 * 开头的行（Javadoc 和多行注释的中间行），hunk 开头的注释状态未知时据此认为处在注释中
+comment_continuation_pattern = re.compile(r'[ +-]\s*\*(?:\s|/|$)')
 
-def clone_repository(url, output_dir):
+# diff 行的类别
+(LINE_CONTEXT, LINE_ADDED, LINE_REMOVED, LINE_DIFF, LINE_HUNK, LINE_FILE_MARKER,
+ LINE_IMPORT, LINE_BLANK, LINE_COMMENT, LINE_IN_COMMENT) = range(10)
+# parse_stream 读取 bytes 时不需要解码和分类的行（测试文件和未启用语言的文件中的行）
+LINE_SKIPPED = 10
+
+class LineLexer:
     """
-    克隆指定的 Git 仓库到本地目录。
-    
+    diff 中一个源文件的逐行分类器。
+
+    修改前的一侧（上下文行和 - 行）和修改后的一侧（上下文行和 + 行）各自保存 Language.scan 的状态，
+    一行是否在注释中、是否只有注释由真正的注释、字符串和字符字面量的边界决定：
+    字符串里的 "/*" 不会开始注释，同一行中 /* */ 之后的代码仍然算作修改，以 * 开头的代码行也不会被当作注释。
+    每行只扫描一遍，上下文行在两侧状态相同时也只扫描一遍。
+
+    两侧的状态在每个 hunk 头重置，hunk 开头之前的内容不在 diff 中：
+    某一侧第一行非空的内容以 * 开头（例如 Javadoc 的中间行）时认为这一侧处在注释中。
+    """
+
+    def __init__(self, language=languages.java):
+        self.language = language
+        self.old_state = self.new_state = 0
+        self.old_known = self.new_known = False
+        self.in_header = True  # 文件头和第一个 hunk 头之间（index、---、+++ 等行）
+
+    def start_hunk(self):
+        """遇到 hunk 头时调用。"""
+        self.old_state = self.new_state = 0
+        self.old_known = self.new_known = False
+        self.in_header = False
+
+    def guess_state(self, line, state):
+        """
+        hunk 开头状态未知的一侧，根据这一行猜测行首的状态。
+
+        返回:
+        - (行首的状态, 状态是否已经确定)，空行不能确定状态。
+        """
+        if blank_content_pattern.match(line, 1):
+            return state, False
+        return (1 if comment_continuation_pattern.match(line) else state), True
+
+    def classify(self, line):
+        """
+        判断源文件中一行 diff（文件头和 hunk 头除外）的类别，同时推进两侧的状态。
+
+        返回:
+        - LINE_FILE_MARKER: 文件头中的 ---/+++ 行。
+        - LINE_IMPORT: 不在注释中、含有 import（C 为 #include）的行。
+        - LINE_BLANK: 空的修改行。
+        - LINE_ADDED / LINE_REMOVED: 在注释之外有内容的修改行。
+        - LINE_COMMENT: 从代码开始、只有注释的修改行，例如 // 注释和 /* 注释的第一行。
+        - LINE_IN_COMMENT: 开始时就在多行注释中、之后也没有代码的行（修改行或上下文行）。
+        - LINE_CONTEXT: 其他上下文行。
+        """
+        first = line[:1]
+        if self.in_header:
+            return LINE_FILE_MARKER if line.startswith('+++') or line.startswith('---') else LINE_CONTEXT
+        language = self.language
+        if first == ' ':
+            old_state, new_state = self.old_state, self.new_state
+            if not self.old_known:
+                old_state, self.old_known = self.guess_state(line, old_state)
+            if not self.new_known:
+                new_state, self.new_known = self.guess_state(line, new_state)
+            self.new_state, _ = language.scan(line, new_state, 1)
+            self.old_state = self.new_state if old_state == new_state else language.scan(line, old_state, 1)[0]
+            if new_state > 0:
+                return LINE_IN_COMMENT
+            return LINE_IMPORT if language.import_marker in line else LINE_CONTEXT
+        if first == '+':
+            state = self.new_state
+            if not self.new_known:
+                state, self.new_known = self.guess_state(line, state)
+            self.new_state, has_code = language.scan(line, state, 1)
+        elif first == '-':
+            state = self.old_state
+            if not self.old_known:
+                state, self.old_known = self.guess_state(line, state)
+            self.old_state, has_code = language.scan(line, state, 1)
+        else:
+            # "\ No newline at end of file" 等
+            return LINE_CONTEXT
+        if state <= 0 and language.import_marker in line:
+            return LINE_IMPORT
+        if blank_content_pattern.match(line, 1):
+            return LINE_BLANK
+        if has_code:
+            return LINE_ADDED if first == '+' else LINE_REMOVED
+        return LINE_IN_COMMENT if state > 0 else LINE_COMMENT
+
+def classify_line(line, lexer=None):
+    """
+    判断一行 diff 的类别。
+
+    参数:
+    - line: 去掉换行符的一行 diff。
+    - lexer: 这一行所在源文件的 LineLexer；为 None 时（测试文件、未启用语言的文件）只区分文件头和 hunk 头。
+
+    返回:
+    - LINE_* 之一。先按第一个字符分派文件头和 hunk 头，其余的行交给 lexer.classify。
+    """
+    first = line[:1]
+    if first == 'd' and line.startswith('diff'):
+        return LINE_DIFF
+    if first == '@' and line.startswith('@@'):
+        return LINE_HUNK
+    if lexer is None:
+        return LINE_CONTEXT
+    return lexer.classify(line)
+
+# 单次遍历 diff 得到的全部指标
+DiffMetrics = namedtuple('DiffMetrics', ['file', 'java_file', 'test_in_commit', 'hunk', 'files_and_ranges', 'lines'])
+
+def get_repository_name(url):
+    """
+    从提交 URL 中提取仓库名。
+
+    参数:
+    - url: 提交的 GitHub URL。
+
+    返回:
+    - (repository_name, repo)，例如 ('FasterXML/jackson-databind', 'jackson-databind')。
+    """
+    repository_name = re.search(r'/([^/]+/[^/]+)/commit/', url).group(1)
+    repo = re.search(r'[^/]+$', repository_name).group()
+    return repository_name, repo
+
+def get_local_path(repository_name):
+    """
+    返回仓库在本地的路径。
+
+    参数:
+    - repository_name: owner/repo 形式的仓库名。
+
+    返回:
+    - mirror 模式下为裸镜像路径，其他模式下为 <base_path1>/<repo>。
+    """
+    if clone_mode == 'mirror':
+        return os.path.abspath(get_mirror_path(base_path1, repository_name))
+    return os.path.abspath(os.path.join(base_path1, repository_name.split('/')[-1]))
+
+def get_remote_url(repository_name):
+    """
+    构造仓库的远程地址。
+
+    参数:
+    - repository_name: owner/repo 形式的仓库名。
+    """
+    if remote_base is None:
+        return f"https://{access_token}@github.com/{repository_name}"
+    return f"{remote_base.rstrip('/')}/{repository_name}"
+
+def plan_clone(url, output_dir, mode=None, commits=None):
+    """
+    计算克隆或更新 url 对应的仓库还需要执行的 git 命令，只做本地检查，不访问网络。
+
     参数:
     - url: Git 仓库的 URL。
     - output_dir: 克隆到本地的目录。
+    - mode: 克隆方式，为 None 时使用全局的 clone_mode。
+    - commits: 部分克隆和镜像需要获取的提交哈希列表，为 None 时只获取 url 中的提交。
 
-    如果仓库已经存在，则跳过克隆。
+    返回:
+    - 按顺序执行的命令列表，仓库已经满足要求时为空。执行完后应再次调用，直到返回空列表。
+
+    完整克隆时，如果仓库已经存在，则跳过克隆。
+    部分克隆（blobless / treeless）只 fetch 这些提交和它们的父提交（--depth=2），
+    文件内容和树在 git diff 等命令需要时才按需下载；仓库已存在时只补充缺少的提交。
+    每个提交都保存在 refs/fw/<hash> 下，避免被 gc 清理。
+    短哈希不能写在 refspec 中：先在本地查找，找不到时（每次运行每个仓库一次）获取所有分支的提交（不含树和文件），
+    之后用 update-ref 把找到的完整哈希记在 refs/fw/<短哈希> 下。
     """
-    try:
-        repository_name = re.search(r'/([^/]+/[^/]+)/commit/', url).group(1)
-        repo = re.search(r'[^/]+$', repository_name).group()
-        repository_url = f"https://{access_token}@github.com/{repository_name}"
-        print(repo)
+    mode = mode or clone_mode
+    repository_name, repo = get_repository_name(url)
+    repository_url = get_remote_url(repository_name)
+    repo_path = os.path.join(output_dir, repo)
+    if commits is None:
+        commits = [extract_commit_hash(url)]
+
+    if mode == 'mirror':
+        return plan_mirror(output_dir, repository_name, repository_url, commits)
 
-        if os.path.exists(os.path.join(output_dir, repo)):
+    if mode == 'full':
+        if os.path.exists(repo_path):
             print(f"Repository {repo} already exists, skipping...")
-            return
+            return []
+        return [["git", "-C", output_dir, "clone", repository_url]]
+
+    partial_filter = partial_clone_filters[mode]
+    commands = []
+    exists = os.path.exists(repo_path)
+    if not exists:
+        commands += [["git", "init", "-q", repo_path],
+                     ["git", "-C", repo_path, "remote", "add", "origin", repository_url],
+                     ["git", "-C", repo_path, "config", "remote.origin.promisor", "true"],
+                     ["git", "-C", repo_path, "config", "remote.origin.partialclonefilter", partial_filter]]
+        fetched = []
+    else:
+        promisor = subprocess.run(["git", "-C", repo_path, "config", "--get", "remote.origin.promisor"],
+                                  capture_output=True, text=True).stdout.strip()
+        if promisor != 'true':
+            print(f"Repository {repo} already exists as a full clone, skipping...")
+            return []
+        # 只看 refs/fw 判断提交是否已经获取，直接查对象会触发部分克隆的按需下载
+        fetched = subprocess.run(["git", "-C", repo_path, "for-each-ref", "--format=%(refname:strip=2)", "refs/fw"],
+                                 capture_output=True, text=True).stdout.split()
+
+    missing = [commit for commit in dict.fromkeys(commits) if commit not in fetched]
+    short = [commit for commit in missing if len(commit) < 40]
+    missing = [commit for commit in missing if len(commit) == 40]
+    shallow = exists and subprocess.run(["git", "-C", repo_path, "rev-parse", "--is-shallow-repository"],
+                                        capture_output=True, text=True).stdout.strip() == 'true'
+    unresolved = []
+    for commit in short:
+        sha = resolve_local_commit(repo_path, commit) if exists else None
+        if sha is not None:
+            commands.append(["git", "-C", repo_path, "update-ref", f"refs/fw/{commit}", sha])
+        else:
+            unresolved.append(commit)
+    if unresolved:
+        if repo_path in fetched_branches:
+            print(f"Commits {', '.join(unresolved)} not found on any branch of {repo}, skipping...")
+        else:
+            fetched_branches.add(repo_path)
+            # 分支的完整历史，浅克隆时同时去掉 --depth 留下的边界，否则更早的提交取不到
+            return commands + [["git", "-C", repo_path, "fetch", "--no-tags", f"--filter={partial_filter}", "origin"]
+                               + (["--unshallow"] if shallow else []) + ["+refs/heads/*:refs/fw-branches/*"]]
+    if missing:
+        # 已经有完整历史时不再用 --depth，否则会在已有的历史上留下浅克隆边界
+        depth = ["--depth=2"] if shallow or not exists else []
+        commands.append(["git", "-C", repo_path, "fetch", "--no-tags"] + depth + [f"--filter={partial_filter}", "origin"]
+                        + [f"{commit}:refs/fw/{commit}" for commit in missing])
+    if not commands:
+        print(f"Repository {repo} already has all commits, skipping...")
+    return commands
+
+def resolve_local_commit(repo_path, commit):
+    """
+    在本地仓库中把短哈希补全为完整的提交哈希，找不到或有歧义时返回 None。
+    短哈希只在本地对象中查找，不会触发部分克隆的按需下载。
+    """
+    result = subprocess.run(["git", "-C", repo_path, "rev-parse", "--verify", "--quiet", f"{commit}^{{commit}}"],
+                            capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
 
-        subprocess.run(["git", "clone", repository_url], check=True)
-        print(f"Successfully cloned {url}")
-        time.sleep(2)
+def clone_repository(url, output_dir, mode=None, commits=None):
+    """
+    克隆指定的 Git 仓库到本地目录，参数见 plan_clone。
+
+    在当前线程中依次执行 plan_clone 给出的命令；批量克隆请使用 clone_repositories。
+    """
+    try:
+        print(get_repository_name(url)[1])
+        for _ in range(3):
+            commands = plan_clone(url, output_dir, mode, commits)
+            if not commands:
+                return
+            for command in commands:
+                subprocess.run(command, check=True)
+            print(f"Successfully cloned {url}")
 
     except Exception as e:
         print(f"Error cloning {url}: {e}")
@@ -74,24 +373,168 @@ def test_finder(url):
     返回:
     - 如果提交包含测试用例，则返回 True；否则返回 False。
     """
-    repository_name = re.search(r'/([^/]+/[^/]+)/commit/', url).group(1)
-    repo = re.search(r'[^/]+$', repository_name).group()
-    os.chdir(os.path.join(base_path1, repo))
+    repository_name, repo = get_repository_name(url)
+    commit_hash = extract_commit_hash(url)
+    # 提交的测试文件索引，没有变化的子树在不同提交之间共享，不再列出整个树
+    index = tree_index.get_tree_index(get_cat_file(get_local_path(repository_name)), commit_hash)
+    return index is not None and index.has_tests()
+
+def find_test_pairs(url, files):
+    """
+    找到与修改的源文件对应的测试文件。
+
+    参数:
+    - url: 包含提交信息的 URL。
+    - files: 修改的源文件路径。
+
+    返回:
+    - {源文件: [测试文件, ...]}，只包含找到测试文件的源文件。
+    """
+    repository_name, repo = get_repository_name(url)
     commit_hash = extract_commit_hash(url)
-    git_ls_tree = f'git ls-tree -r {commit_hash}'
-    result = subprocess.run(['cmd', '/c', git_ls_tree], capture_output=True, text=True)
-    return bool(result.stdout)
+    index = tree_index.get_tree_index(get_cat_file(get_local_path(repository_name)), commit_hash)
+    if index is None:
+        return {}
+    pairs = {}
+    for file_path in files:
+        tests = index.pair_tests(file_path)
+        if tests:
+            pairs[file_path] = tests
+    return pairs
 
 class DiffParser:
-    def __init__(self, diff_output):
+    def __init__(self, diff_output='', repo=None, commit_hash=None):
         """
         初始化 DiffParser 对象，解析 diff 输出。
 
         参数:
-        - diff_output: git diff 命令的输出。
+        - diff_output: git diff 命令的输出。流式解析时可以为空，由 parse_stream 传入行迭代器。
+        - repo: 本地仓库路径，extract_functions 用它定位文件；只做解析（parse_stream 等）时可以为 None。
+        - commit_hash: diff 对应的提交，extract_functions 从这个提交读取文件内容；为 None 时读取工作区中的文件。
         """
         self.lines = diff_output.splitlines(keepends=False)
         self.diff_output = diff_output
+        self.repo = repo
+        self.commit_hash = commit_hash
+        self.method_indexes = {}  # 本次分析中已经建立的方法索引，按路径缓存
+
+    def parse_stream(self, lines=None):
+        """
+        单次遍历 diff，同时得到 parse_file、parse_hunk 和 extract_diff_file_and_lines 的结果。
+
+        参数:
+        - lines: diff 行的迭代器，例如 git diff 管道的 stdout；为 None 时使用 self.lines。
+          也可以是 bytes 行的迭代器（二进制模式的管道），或者整个 diff 的 bytes / memoryview。
+
+        返回:
+        - DiffMetrics(file, java_file, test_in_commit, hunk, files_and_ranges, lines)
+
+        只保存当前行的状态，不需要把整个 diff 读进内存。
+        每个文件在文件头按扩展名取一次语言（languages.get_language），之后的行按这个语言的规则分类，
+        只有启用的语言的文件计入 java_file、hunk 和修改范围。
+        启用语言的非测试文件中的行由这个文件的 LineLexer 分类，注释和字符串的状态在修改前后两侧分别跟踪。
+        输入为 bytes 时只解码文件头、hunk 头和启用语言的非测试文件中的行，其他文件的内容不做解码。
+        """
+        if lines is None:
+            lines = self.lines
+        elif isinstance(lines, (bytes, bytearray, memoryview)):
+            lines = io.BytesIO(lines)
+
+        # parse_file 的状态
+        file = 0
+        java_file = 0
+        test_in_commit = 0
+        # parse_hunk 的状态
+        pointer = -1
+        hunk = 0
+        is_in_hunk = 0
+        lexer = None  # 当前文件的 LineLexer，测试文件和未启用语言的文件为 None
+        # extract_diff_file_and_lines 的状态
+        files_and_ranges = {}
+        current_file = None
+        is_range_file = False
+
+        index = 0
+        for index, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.rstrip(b'\r\n')
+                first = line[:1]
+                if first == b'd' and line.startswith(b'diff'):
+                    line = line.decode('utf-8', errors='replace')
+                    kind = LINE_DIFF
+                elif first == b'@' and line.startswith(b'@@'):
+                    line = line.decode('utf-8', errors='replace')
+                    kind = LINE_HUNK
+                elif lexer is None:
+                    # 后面不会再检查这一行，保留原始字节
+                    kind = LINE_SKIPPED
+                else:
+                    kind = lexer.classify(line.decode('utf-8', errors='replace'))
+            else:
+                line = line.rstrip('\r\n')
+                kind = classify_line(line, lexer)
+
+            if kind == LINE_DIFF:
+                file_is_test = test_file_pattern.search(line) is not None
+                if file_is_test:
+                    test_in_commit = 1
+                else:
+                    file += 1
+                    if languages.get_language(line) is not None:
+                        java_file += 1
+                if line.startswith('diff --git'):
+                    match = diff_file_pattern.search(line)
+                    if match:
+                        current_file = match.group(1)
+                        is_range_file = languages.get_language(current_file) is not None
+                        if is_range_file:
+                            files_and_ranges[current_file] = []
+                        else:
+                            current_file = None
+                # 以下与 parse_hunk 的判断顺序保持一致
+                language = languages.get_language(line)
+                lexer = LineLexer(language) if language is not None and not file_is_test else None
+                # 文件头按内容再判断一次 import，与 parse_hunk 相同
+                if lexer is not None and language.import_marker not in line:
+                    is_in_hunk = 0
+                continue
+            if kind == LINE_HUNK:
+                if current_file and is_range_file:
+                    header = hunk_header_pattern.search(line)
+                    if header:
+                        start_line = int(header.group(1))
+                        line_count = int(header.group(2)) if header.group(2) else 1
+                        files_and_ranges[current_file].append((start_line, start_line + line_count - 1))
+                if is_in_hunk == 1:
+                    pointer = index
+                    is_in_hunk = 0
+                if lexer is not None:
+                    lexer.start_hunk()
+                continue
+
+            if lexer is None or kind == LINE_IMPORT or kind == LINE_FILE_MARKER:
+                continue
+            if kind == LINE_CONTEXT:
+                is_in_hunk = 0
+                continue
+
+            if kind == LINE_BLANK or kind == LINE_IN_COMMENT:
+                if is_in_hunk == 1:
+                    pointer = index
+                continue
+
+            is_in_hunk = 1
+
+            if kind == LINE_COMMENT:
+                if pointer != -1:
+                    pointer = index
+                continue
+
+            if pointer == -1 or index != pointer + 1:
+                hunk += 1
+            pointer = index
+
+        return DiffMetrics(file, java_file, test_in_commit, hunk, files_and_ranges, index)
 
     def parse_hunk(self):
         """
@@ -103,90 +546,55 @@ class DiffParser:
         pointer = -1  # 指针，用于记录行索引
         hunk = 0  # Hunk 的数量
         is_in_hunk = 0  # 标志位，表示是否在 Hunk 中
-        is_comment = 0  # 标志位，表示是否在注释中
-        is_test_case = 0  # 标志位，表示是否为测试用例文件
+        lexer = None  # 当前源文件的 LineLexer，测试文件和未启用语言的文件为 None
 
         for index, line in enumerate(self.lines, start=1):
             if line.startswith('@@'):
                 if is_in_hunk == 1:
                     pointer = index  # 更新指针到当前行
                     is_in_hunk = 0
-                is_comment = 0  # 重置注释标志位
+                if lexer is not None:
+                    lexer.start_hunk()  # 重置两侧的注释和字符串状态
                 continue
-            
-            if line.find('*/') != -1 and is_comment == 1:
-                is_comment = 0  # 注释结束
-                if is_in_hunk == 1:
-                    pointer = index
+
+            if line.startswith("diff"):
+                language = languages.get_language(line)  # 按扩展名取得语言
+                is_test_case = test_file_pattern.search(line) is not None  # 测试用例文件不计入
+                lexer = LineLexer(language) if language is not None and not is_test_case else None
+                if lexer is not None and line.find(language.import_marker) == -1:
+                    is_in_hunk = 0
+                continue
+            if lexer is None:
                 continue
 
-            if is_comment == 1:
+            kind = lexer.classify(line)
+            if kind == LINE_IMPORT or kind == LINE_FILE_MARKER:
+                continue
+            if kind == LINE_CONTEXT:
+                is_in_hunk = 0
+                continue
+
+            # 空行和多行注释中的行不打断 Hunk
+            if kind == LINE_BLANK or kind == LINE_IN_COMMENT:
                 if is_in_hunk == 1:
                     pointer = index
                 continue
 
-            if line.startswith("diff"):
-                is_test_case = 0  # 重置测试用例标志位
-                is_java_file = 0  # 重置 Java 文件标志位
-                test_pattern = "^diff --git.*[Tt][Ee][Ss][Tt].*$"
-                test_ans = re.search(test_pattern, line)
-                if test_ans:
-                    is_test_case = 1
-                java_pattern = r"^diff --git.*\.java$"
-                java_ans = re.search(java_pattern, line)
-                if java_ans:
-                    is_java_file = 1
-            if is_test_case == 1:
-                continue
-            if is_java_file == 0:
+            is_in_hunk = 1
+
+            # 只有注释的修改行
+            if kind == LINE_COMMENT:
+                if pointer == -1:
+                    continue
+                pointer = index
                 continue
 
-            # 处理修改行（+/-开头的行）
-            if line.find("import") == -1:
-                if line[0] == '-' or line[0] == "+":
-                    if any(line.startswith(ignore) for ignore in ["+++", "---"]):
-                        continue
-
-                    if bool(empty_or_whitespace_pattern.match(line[1:])):
-                        if is_in_hunk == 1:
-                            pointer = index
-                        continue
-
-                    is_in_hunk = 1
-                    
-                    if single_line_comment_pattern.match(line):
-                        if pointer == -1:
-                            continue
-                        if is_in_hunk == 1:
-                            pointer = index
-                        continue
-
-                    if multi_line_comment_start_pattern.match(line):
-                        if pointer == -1:
-                            is_comment = 1
-                            continue
-                        is_comment = 1
-                        if is_in_hunk == 1:
-                            pointer = index
-                        continue
-
-                    if pointer == -1:
-                        pointer = index
-                        hunk += 1
-                        print("hunk:", hunk)
-                        print("line:", line)
-                    else:
-                        if index == (pointer + 1):
-                            if is_in_hunk == 1:
-                                pointer = index
-                        else:
-                            if is_in_hunk == 1:
-                                pointer = index
-                            hunk += 1
-                            print("hunk:", hunk)
-                            print("line:", line)
-                else:
-                    is_in_hunk = 0
+            # 有效的修改行（+/-开头、注释之外有内容）
+            if pointer == -1 or index != pointer + 1:
+                hunk += 1
+                print("hunk:", hunk)
+                print("line:", line)
+            pointer = index
 
         print(hunk)
         return hunk
@@ -197,7 +605,7 @@ class DiffParser:
 
         返回:
         - file: 总文件数量
-        - java_file: Java 文件数量
+        - java_file: 启用的语言（默认只有 Java）的文件数量
         - test_in_commit: 是否包含测试用例
         """
         file = 0
@@ -208,15 +616,14 @@ class DiffParser:
         for line in self.lines:
             if line.startswith("diff"):
                 is_test_case = 0
-                pattern = "^diff --git.*[Tt][Ee][Ss][Tt].*$"
-                if re.search(pattern, line):
+                if test_file_pattern.search(line):
                     is_test_case = 1
             if is_test_case == 1:
                 test_in_commit = 1
                 continue
             if line.startswith("diff"):
                 file += 1
-                if line.endswith(".java"):
+                if languages.get_language(line) is not None:
                     java_file += 1
 
         print("[java_file]:", java_file)
@@ -226,21 +633,21 @@ class DiffParser:
     
     def extract_diff_file_and_lines(self):
         """
-        从 diff 输出中提取 Java 文件及其修改的行号范围。
+        从 diff 输出中提取启用的语言的源文件及其修改的行号范围。
 
         返回:
-        - files_and_ranges: 包含 Java 文件路径和行号范围的字典。
+        - files_and_ranges: 包含源文件路径和行号范围的字典。
         """
-        files_and_ranges = {}  # 存储 Java 文件路径和行号范围
+        files_and_ranges = {}  # 存储源文件路径和行号范围
         current_file = None  # 当前文件路径
-        is_java_file = False  # 当前文件是否为 Java 文件
+        is_java_file = False  # 当前文件是否为启用的语言的源文件
 
         for line in self.lines:
             if line.startswith('diff --git'):
                 match = re.search(r'diff --git a/(.*?) b/\1', line)
                 if match:
                     current_file = match.group(1)
-                    is_java_file = current_file.endswith('.java')
+                    is_java_file = languages.get_language(current_file) is not None
                     if is_java_file:
                         files_and_ranges[current_file] = []
                     else:
@@ -256,69 +663,99 @@ class DiffParser:
 
         return files_and_ranges
 
-    def extract_functions_from_file(self, file_path, start_line, end_line):
+    def extract_functions_from_file(self, file_path, start_line, end_line, lines=None):
         """
-        从 Java 文件中提取函数名。
+        从源文件中提取与修改范围重叠的函数名，方法定义行按文件的语言识别。
 
         参数:
         - file_path: 文件路径。
         - start_line: 起始行号。
         - end_line: 结束行号。
+        - lines: 已经读出的文件内容，为 None 时从 file_path 读取。
 
         返回:
         - functions: 提取的函数名列表。
         """
-        functions = []
-        func_pattern = re.compile(r'^\s*(public|private|protected)?\s*(static)?\s*[\w<>\[\]]+\s+(\w+)\s*\(([^)]*)\)\s*(throws\s+\w+(?:\s*,\s*\w+)*)?\s*{')
-
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                lines = file.readlines()
-                
-                # 向前遍历直到第一个函数定义
-                found_function = False
-                i = start_line - 1
-                while i >= 0:
-                    line = lines[i].strip()
-                    match = func_pattern.match(line)
-                    if match:
-                        function_name = f"{match.group(3)}({match.group(4)})"
-                        functions.append(function_name)
-                        found_function = True
-                        break
-                    i -= 1
-
-                # 遍历修改的行号范围
-                for i in range(start_line - 1, min(end_line, len(lines))):
-                    line = lines[i].strip()
-                    match = func_pattern.match(line)
-                    if match:
-                        function_name = f"{match.group(3)}({match.group(4)})"
-                        functions.append(function_name)
-
+            if lines is None:
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    lines = file.read().split('\n')
+            language = languages.get_language(file_path) or languages.java
+            return method_index.MethodIndex(lines, language.method_pattern).lookup(start_line, end_line)
         except FileNotFoundError:
             print(f"File {file_path} not found.")
         except Exception as e:
             print(f"Error reading file {file_path}: {e}")
+        return []
+
+    def get_method_index(self, repo_path, file_path):
+        """
+        取得文件的方法范围索引。
+
+        参数:
+        - repo_path: 本地仓库路径。
+        - file_path: 文件在仓库中的路径。
+
+        返回:
+        - MethodIndex，文件不存在时为空索引。
+
+        有 commit_hash 时读取文件在这个提交中的内容（修改后的版本），索引按 blob 哈希和语言缓存，
+        其他提交中内容相同的文件直接复用，不再读取和扫描；否则读取工作区中的文件。
+        """
+        if file_path in self.method_indexes:
+            return self.method_indexes[file_path]
+
+        language = languages.get_language(file_path) or languages.java
 
-        return functions
+        if self.commit_hash is None:
+            try:
+                with open(os.path.join(repo_path, file_path), 'r', encoding='utf-8') as file:
+                    index = method_index.MethodIndex(file.read().split('\n'), language.method_pattern)
+            except FileNotFoundError:
+                print(f"File {file_path} not found.")
+                index = method_index.MethodIndex([])
+            except Exception as e:
+                print(f"Error reading file {file_path}: {e}")
+                index = method_index.MethodIndex([])
+        else:
+            cat = get_cat_file(repo_path)
+            found = cat.check_object(f'{self.commit_hash}:{file_path}')
+            index = method_index.get_cached_index((found[0], language.name)) if found is not None and found[1] == 'blob' else None
+            if index is None:
+                blob = cat.read_blob(found[0]) if found is not None and found[1] == 'blob' else None
+                if blob is None:
+                    print(f"File {file_path} not found in {self.commit_hash}.")
+                    index = method_index.MethodIndex([])
+                else:
+                    # 只按 \n 切分，与 diff 中的行号一致
+                    index = method_index.MethodIndex(blob.decode('utf-8', errors='replace').split('\n'), language.method_pattern)
+                    method_index.put_cached_index((found[0], language.name), index)
+        self.method_indexes[file_path] = index
+        return index
 
-    def extract_functions(self):
+    def extract_functions(self, files_and_ranges=None):
         """
         从 diff 输出中提取修改的函数名。
 
+        参数:
+        - files_and_ranges: parse_stream 得到的文件与行号范围，为 None 时重新扫描 diff。
+
         返回:
-        - modified_functions: 修改的函数名列表。
+        - modified_functions: 修改的函数名列表，每个修改范围对应包含它的方法和在范围内定义的方法。
+
+        创建 DiffParser 时没有传入 repo 时抛出 ValueError。
         """
+        if self.repo is None:
+            raise ValueError('DiffParser.extract_functions needs the local repository path: DiffParser(repo=...)')
         modified_functions = [] # 存储修改的函数名
-        files_and_ranges = self.extract_diff_file_and_lines() # 提取 Java 文件及其修改的行号范围
+        if files_and_ranges is None:
+            files_and_ranges = self.extract_diff_file_and_lines() # 提取源文件及其修改的行号范围
 
         for file_path, ranges in files_and_ranges.items(): # 遍历文件及其修改的行号范围
-            full_file_path = os.path.join(base_path1, repo, file_path) # 获取文件的完整路径
+            index = self.get_method_index(self.repo, file_path) # 每个文件只建立一次索引
 
             for start_line, end_line in ranges: # 遍历修改的行号范围
-                functions_in_range = self.extract_functions_from_file(full_file_path, start_line, end_line) # 提取函数名
-                modified_functions.extend(functions_in_range) # 添加到列表
+                modified_functions.extend(index.lookup(start_line, end_line)) # 二分查找重叠的方法
         print(modified_functions) # 打印修改的函数名列表
         return modified_functions # 返回修改的函数名列表
 
@@ -328,73 +765,578 @@ def get_commit_subject(commit_hash, repo_path):
 
     参数:
     - commit_hash: 提交的哈希值。
-    - repo_path: 仓库路径。
+    - repo_path: 仓库目录名（相对于 base_path1）或完整路径。
 
     返回:
     - 提交主题（如果获取成功），否则返回 None。
     """
     path_str = os.path.join(base_path1, repo_path)
-    command = ["git", "-C", path_str, "show", "--format=%s", "-s", commit_hash]
-    result = subprocess.run(command, capture_output=True, text=True)
+    with profiler.stage('commit_subject'):
+        commit = get_cat_file(path_str).read_commit(commit_hash)
 
-    if result.returncode == 0:
-        return result.stdout.strip()
+    if commit is not None:
+        return commit['subject']
     else:
         print("Failed to get commit subject")
-        print("Error:", result.stderr)
+        print("Error:", f"{commit_hash} not found in {path_str}")
         return None
 
-if __name__ == '__main__':
-    max_workers = 5
+def needs_quote(path):
+    """git 在 diff 头中是否会给路径加引号（core.quotePath 为默认值时）。"""
+    return any(c in '"\\' or ord(c) < 0x20 or ord(c) >= 0x7f for c in path)
+
+def list_changed_files(repo_path, commit_hash):
+    """
+    用 git diff --name-status 列出提交修改的文件，不读取文件内容。
+
+    返回:
+    - [(旧路径, 新路径), ...]，命令失败时返回 None。
+    """
+    with profiler.stage('name_status'):
+        result = subprocess.run(['git', '-C', repo_path, 'diff', '--name-status', '-z', f'{commit_hash}^..{commit_hash}'],
+                                capture_output=True)
+        profiler.add('subprocesses')
+        profiler.add('bytes', len(result.stdout))
+    if result.returncode != 0:
+        return None
+    fields = result.stdout.decode('utf-8', errors='surrogateescape').split('\0')
+    changes = []
+    i = 0
+    while i < len(fields) - 1:
+        status = fields[i]
+        if status[:1] in ('R', 'C'):
+            changes.append((fields[i + 1], fields[i + 2]))
+            i += 3
+        else:
+            changes.append((fields[i + 1], fields[i + 1]))
+            i += 2
+    return changes
+
+def count_changed_files(changes):
+    """
+    只根据文件名得到与 parse_file 相同的统计结果。
+
+    参数:
+    - changes: list_changed_files 的结果。
+
+    返回:
+    - (file, java_file, test_in_commit, pathspecs)，pathspecs 为需要取 diff 的启用语言的源文件。
+      测试文件也包括在内：它们不计入 hunk，但修改范围与旧版本一样计入 extract_functions。
+    """
+    file = 0
+    java_file = 0
+    test_in_commit = 0
+    pathspecs = []
+    for old_path, new_path in changes:
+        # 与 diff 头 "diff --git a/<旧路径> b/<新路径>" 使用相同的判断
+        is_java = languages.get_language(new_path) is not None and not needs_quote(new_path)
+        if is_java:
+            pathspecs.append(':(literal)' + new_path)
+            if old_path != new_path:
+                pathspecs.append(':(literal)' + old_path)
+        if test_file_pattern.search(f'diff --git a/{old_path} b/{new_path}'):
+            test_in_commit = 1
+            continue
+        file += 1
+        if is_java:
+            java_file += 1
+    return file, java_file, test_in_commit, pathspecs
+
+def get_metrics_version():
+    """缓存中指标的版本：解析版本和启用的语言，只取源文件的 diff 时另外区分。"""
+    return f'{parser_version}:{languages.enabled_key()}' + (':filtered' if diff_filter else '')
+
+def analyze_commit(url):
+    """
+    分析一个提交 URL 对应的 diff。
+
+    参数:
+    - url: 提交的 GitHub URL。
+
+    返回:
+    - 输出 CSV 的一行 [url, repo, file, java_file, func, hunk, test, note]，出错时返回 None。
+    """
+    try:
+        commit_hash = extract_commit_hash(url)
+        repository_name, _ = get_repository_name(url)
+        repo = get_local_path(repository_name)
+        cache = get_diff_cache()
+        if cache is not None:
+            with profiler.stage('cache'):
+                cached = cache.get_metrics(repository_name, commit_hash, get_metrics_version())
+            if cached is not None:
+                print(f"{url} found in cache")
+                return [url, repository_name] + cached
+        note = get_commit_subject(commit_hash, repo)
+        parser = DiffParser(repo=repo, commit_hash=commit_hash)
+
+        # 只取启用语言的源文件的 diff 时，文件数和测试标志由 --name-status 得到
+        changes = list_changed_files(repo, commit_hash) if diff_filter else None
+        diff_key = commit_hash
+        pathspecs = []
+        no_source = False
+        if changes is not None:
+            file, java_file, test_in_commit, pathspecs = count_changed_files(changes)
+            # 没有启用语言的源文件时不必取 diff；pathspec 太长时取完整的 diff（缓存键与完整模式相同）
+            no_source = not pathspecs
+            if sum(len(pathspec) + 1 for pathspec in pathspecs) > max_pathspec_chars:
+                print(f"{len(pathspecs)} paths exceed max_pathspec_chars, reading the full diff")
+                pathspecs = []
+            else:
+                diff_key = f'{commit_hash}:{languages.enabled_key()}'
+
+        with profiler.stage('cache'):
+            diff_output = cache.get_diff(repository_name, diff_key, raw=True) if cache is not None else None
+        if diff_output is not None:
+            with profiler.stage('parse'):
+                metrics = parser.parse_stream(diff_output)
+        elif no_source:
+            metrics = DiffMetrics(file, java_file, test_in_commit, 0, {}, 0)
+        else:
+            diff_command = ['git', '-C', repo, 'diff', f'{commit_hash}^..{commit_hash}']
+            if pathspecs:
+                diff_command += ['--'] + pathspecs
+            print(' '.join(diff_command[:6]) + (f' -- ({len(pathspecs)} paths)' if pathspecs else ''))
+            # 直接从 git diff 的管道逐行解析原始字节，不再保存完整的 diff_output，只解码需要检查的行
+            # 开启计时时，等待 git diff 输出的时间计入 git_diff 阶段，其余的时间计入 parse
+            with profiler.stage('parse'), subprocess.Popen(diff_command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as proc:
+                profiler.add('subprocesses')
+                stdout = profiler.wrap_pipe(proc.stdout, 'git_diff')
+                lines = stdout if cache is None else DiffRecorder(stdout)
+                metrics = parser.parse_stream(lines)
+            if cache is not None and metrics.lines > 0:
+                with profiler.stage('cache'):
+                    cache.put_diff(repository_name, diff_key, lines.data())
+        if changes is not None:
+            metrics = metrics._replace(file=file, java_file=java_file, test_in_commit=test_in_commit)
+        elif metrics.lines < 1:
+            print("the repo local is bad")
+            diff_url = url + '.diff'
+            with profiler.stage('http_diff'):
+                response = http_client.get_client().get(diff_url)
+                res = response.content if response.status_code == 200 else None
+                profiler.add('bytes', len(response.content))
+            if res is not None:
+                print("it is solved")
+                with profiler.stage('parse'):
+                    metrics = parser.parse_stream(res)
+                if cache is not None and metrics.lines > 0:
+                    cache.put_diff(repository_name, commit_hash, zlib.compress(res))
+        file, java_file, test_in_commit, hunk = metrics.file, metrics.java_file, metrics.test_in_commit, metrics.hunk
+        print("[java_file]:", java_file)
+        print("[file]:", file)
+        print("[test_in_commit]:", test_in_commit)
+        print(hunk)
+        with profiler.stage('extract_functions'):
+            functions = len(parser.extract_functions(metrics.files_and_ranges))
 
-    # 读取输入的 CSV 文件，获取所有的仓库 URL
-    with open(input_csv) as csvfile:
-        reader = csv.reader(csvfile)
-        urls = [row[3] for row in reader]
+        test_in_repo = 0
+        if test_in_commit == 0:
+            with profiler.stage('test_finder'):
+                if test_finder(url):
+                    test_in_repo = 1
+        if show_test_pairs:
+            with profiler.stage('test_pairs'):
+                print("[test_pairs]:", find_test_pairs(url, metrics.files_and_ranges))
 
-    # 克隆所有仓库
-    os.chdir(base_path1)
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for url in urls:
-            executor.submit(clone_repository, url, base_path1)
+        row = [url, repository_name, file, java_file, functions, hunk, test_in_commit | test_in_repo, note]
+        print(row)
+        # 只缓存本地仓库完整时的结果
+        if cache is not None and note is not None:
+            cache.put_metrics(repository_name, commit_hash, get_metrics_version(), row[2:])
+        return row
+    except Exception as e:
+        print(f"Error processing {url}: {e}")
+        return None
+
+def get_parser_version():
+    """
+    计算解析逻辑的版本号。
+
+    返回:
+    - DiffParser、LineLexer、classify_line、test_finder、analyze_commit、method_index、tree_index、languages 源码和各正则模式的哈希，
+      这些代码改变后版本号随之改变，缓存中旧版本的指标自动失效。
+    """
+    sources = [inspect.getsource(obj) for obj in (DiffParser, LineLexer, classify_line, test_finder, analyze_commit,
+                                                  method_index, tree_index, languages)]
+    sources += [pattern.pattern for pattern in (test_file_pattern, diff_file_pattern, hunk_header_pattern,
+                                                blank_content_pattern, comment_continuation_pattern)]
+    return hashlib.sha1('\n'.join(sources).encode('utf-8')).hexdigest()[:16]
+
+parser_version = get_parser_version()
+
+# 每个进程各自打开一个缓存连接
+_diff_cache = None
+
+def get_diff_cache():
+    """
+    返回当前进程的 DiffCache，cache_path 为 None 时返回 None。
+    """
+    global _diff_cache
+    if cache_path is None:
+        return None
+    if _diff_cache is None or _diff_cache.path != cache_path:
+        _diff_cache = DiffCache(cache_path, cache_max_bytes)
+    return _diff_cache
+
+def clone_repositories(urls, output_dir, concurrency=4, max_concurrency=16):
+    """
+    用 asyncio 并发克隆输入中出现的所有仓库。
+
+    参数:
+    - urls: 提交 URL 列表。
+    - output_dir: 克隆到本地的目录。
+    - concurrency: 初始并发数，运行中根据吞吐量和失败情况自动调整。
+    - max_concurrency: 并发数上限。
 
-    # 输出 CSV 文件初始化
-    with open(output_csv, 'w') as f:
-        f.write("url,repo,file,java_file,func,hunk,test,note\n")
+    返回:
+    - {owner/repo: 是否成功}
 
-    # 分析每个仓库的提交记录
-    for url in urls:
+    同一个仓库只克隆一次，部分克隆时一次 fetch 它的全部提交；
+    mirror 模式下同一项目族的仓库依次克隆，后克隆的 fork 可以引用先克隆的镜像。
+    """
+    groups = {}
+    for items in group_by_repository(enumerate(urls)):
+        url = items[0][1]
         try:
-            commit_hash = extract_commit_hash(url)
-            repo = repository_name = re.search(r'/([^/]+/[^/]+)/commit/', url).group(1)
-            repo = re.search(r'[^/]+$', repository_name).group()
-            note = get_commit_subject(commit_hash, repo)
-            os.chdir(os.path.join(base_path1, repo))
-            diff_command = f'git diff {commit_hash}^..{commit_hash}'  # 注意添加了空格
-            diff_output = subprocess.run(['pwsh', '-Command', diff_command], capture_output=True, text=True, encoding='utf-8').stdout
-            print(diff_command)
-            if len(diff_output) < 1:
-                print("the repo local is bad")
-                diff_url = url + '.diff'
-                res = requests.get(diff_url).text
-                if res is not None:
-                    print("it is solved")
-                    diff_output = res
-            parser = DiffParser(diff_output)
-            with open(output_csv, 'a') as f:
-                file, java_file, test_in_commit = parser.parse_file()
-                hunk = parser.parse_hunk()
-                functions = len(parser.extract_functions())
-
-                string = "URL: {}   Repo: {}   file: {}   java_file: {}   functions: {}   hunk: {}\n".format(url, repo, file, java_file, functions, hunk)
-                test_in_repo = 0
-                if test_in_commit == 0:
-                    if test_finder(url):
-                        test_in_repo = 1
-
-                string = "{},{},{},{},{},{},{},{}\n".format(url, repository_name, file, java_file, functions, hunk, test_in_commit | test_in_repo, note)
-                f.write(string)
-                print(string)
-        except Exception as e:
-            print(f"Error processing {url}: {e}")
+            repository_name = get_repository_name(url)[0]
+        except AttributeError:
+            print(f"Error cloning {url}: not a commit URL")
+            continue
+        key = get_family(repository_name) if clone_mode == 'mirror' else repository_name
+        commits = [extract_commit_hash(u) for _, u in items]
+        plan = functools.partial(plan_clone, url, output_dir, clone_mode, commits)
+        groups.setdefault(key, []).append((repository_name, plan))
+
+    orchestrator = CloneOrchestrator(concurrency, max_concurrency)
+    with profiler.task(f'{sum(len(group) for group in groups.values())} repositories', kind='clone'), profiler.stage('clone'):
+        return asyncio.run(orchestrator.run(list(groups.values())))
+
+def group_by_repository(items):
+    """
+    按 owner/repo 把提交分组，同一个仓库的提交交给同一个 worker。
+
+    参数:
+    - items: (index, url) 的可迭代对象，index 为 URL 在输入中的位置。
+
+    返回:
+    - [[(index, url), ...], ...]，分组按首次出现的顺序排列。
+    """
+    groups = {}
+    for index, url in items:
+        match = re.search(r'/([^/]+/[^/]+)/commit/', url)
+        key = match.group(1) if match else url
+        groups.setdefault(key, []).append((index, url))
+    return list(groups.values())
+
+def analyze_group(items):
+    """
+    在同一个进程中依次分析同一仓库的提交，复用该仓库的 git cat-file 进程和页缓存。
+
+    参数:
+    - items: group_by_repository 得到的一组 (index, url)。
+
+    返回:
+    - ([(index, row), ...], 各提交的计时记录)，没有开启计时（profiler.enabled）时记录为空列表。
+    """
+    results = []
+    for index, url in items:
+        with profiler.task(url):
+            results.append((index, analyze_commit(url)))
+    try:
+        repository_name, _ = get_repository_name(items[0][1])
+        get_cat_file(get_local_path(repository_name)).close()  # 这个仓库之后不会再用到
+    except AttributeError:
+        pass
+    return results, profiler.drain()
+
+class OrderedRowWriter:
+    """
+    按输入顺序写出分析结果。
+
+    结果可能乱序到达，先到的行暂存在 pending 中，直到前面的行都写出。
+    每写出 sync_every 行执行一次 flush 和 fsync，中途崩溃最多丢失最后一批。
+    store 不为 None 时同一批行也追加到列式存储（results_store.ResultsStore），
+    并且先于 CSV 落盘，存储中的行总是 CSV 中已完成的行的超集。
+    cwes 为输入位置到 CWE 的字典，写出一行时取出这一行自己的 CWE，同一个提交在不同 CWE 下出现多次时各自保留。
+    """
+
+    def __init__(self, f, sync_every=20, store=None, cwes=None):
+        self.file = f
+        self.writer = csv.writer(f)
+        self.sync_every = sync_every
+        self.unsynced = 0
+        self.pending = {}
+        self.next_index = 0
+        self.store = store
+        self.cwes = cwes if cwes is not None else {}
+        self.batch = []
+        self.batch_cwes = []
+
+    def add(self, index, row):
+        self.pending[index] = row
+        while self.next_index in self.pending:
+            row = self.pending.pop(self.next_index)
+            cwe = self.cwes.pop(self.next_index, '')
+            if row is not None:
+                self.writer.writerow(row)
+                self.unsynced += 1
+                if self.store is not None:
+                    self.batch.append(row)
+                    self.batch_cwes.append(cwe)
+            self.next_index += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """把已写出的行落盘。"""
+        if self.store is not None:
+            self.store.append(self.batch, self.batch_cwes)
+            self.batch = []
+            self.batch_cwes = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+def load_finished_urls(output_path):
+    """
+    读取已有的输出 CSV，得到已经分析完成的 URL。
+
+    参数:
+    - output_path: 输出 CSV 文件路径。
+
+    返回:
+    - 已完成的 URL 及其行数（Counter），同一个 URL 可以在不同的 CWE 下出现多次。
+      文件末尾不完整的一行（上次运行中途崩溃）会被截掉。
+    """
+    if not os.path.exists(output_path):
+        return Counter()
+    with open(output_path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            print(f"Dropping incomplete last row of {output_path}")
+            f.truncate(end)
+    with open(output_path, newline='', encoding='utf-8') as f:
+        return Counter(row[0] for row in csv.reader(f) if row and row[0] != output_header[0])
+
+def skip_finished(commits, finished):
+    """
+    跳过已经完成的行：每个 URL 跳过前 finished[url] 次出现，输出按输入顺序写出，所以这些就是已完成的行。
+    """
+    for commit in commits:
+        if finished[commit.url] > 0:
+            finished[commit.url] -= 1
             continue
+        yield commit
+
+def init_worker(base_path, cache_file=None, cache_size=cache_max_bytes, mode='full', http_cache=None, java_only=False, profile=False, language_names=('java',),
+                test_pairs=False):
+    """
+    进程池 worker 的初始化函数，把主进程的仓库目录、缓存设置、克隆方式、是否计时、启用的语言和是否打印测试文件对传给子进程。
+    """
+    global base_path1, cache_path, cache_max_bytes, clone_mode, diff_filter, show_test_pairs
+    base_path1 = base_path
+    show_test_pairs = test_pairs
+    diff_filter = java_only
+    clone_mode = mode
+    cache_path = cache_file
+    cache_max_bytes = cache_size
+    http_client.http_cache_dir = http_cache
+    profiler.enabled = profile
+    languages.set_enabled(language_names)
+
+def count_output_rows(output_path):
+    """输出 CSV 中的结果行数（不含表头）。"""
+    if not os.path.exists(output_path):
+        return 0
+    with open(output_path, newline='', encoding='utf-8') as f:
+        return sum(1 for row in csv.reader(f) if row and row[0] != output_header[0])
+
+def get_worker_context():
+    """
+    进程池使用的 multiprocessing 上下文。
+
+    克隆线程和分析同时进行，直接 fork 出的 worker 会继承克隆线程中正在创建的子进程的管道，
+    subprocess 等不到管道关闭就会一直阻塞；forkserver 从一个干净的服务进程 fork worker，没有这个问题。
+    Windows 上只有 spawn，返回 None 使用默认值。
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return None
+
+def iter_chunks(commits, first=None, limit=None):
+    """
+    把提交分成越来越大的批：first, 2*first, 4*first ... 直到 limit。
+
+    参数:
+    - commits: input_reader.CommitRow 的可迭代对象。
+    - first / limit: 第一批的大小和每批的上限，默认为 first_chunk_size 和 chunk_size。
+    """
+    size = first or first_chunk_size
+    limit = limit or chunk_size
+    chunk = []
+    for commit in commits:
+        chunk.append(commit)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+            size = min(size * 2, limit)
+    if chunk:
+        yield chunk
+
+def run_analysis(commits, output_path, jobs=1, resume=False, store_path=None, concurrency=4, max_concurrency=16,
+                 profile_path=None, trace_path=None):
+    """
+    克隆仓库、分析所有提交，并按输入顺序写入输出 CSV。
+
+    参数:
+    - commits: input_reader.CommitRow 的可迭代对象，可以是 read_commits 返回的生成器。
+    - output_path: 输出 CSV 文件路径。
+    - jobs: 并行分析的进程数，1 表示在当前进程中串行分析。
+    - resume: 为 True 时保留已有的输出，跳过其中已经完成的 URL，只追加新的行。
+    - store_path: 列式结果存储的目录，为 None 时只写 CSV；CWE 取自输入行。
+    - concurrency / max_concurrency: 克隆的初始并发数和最大并发数。
+    - profile_path / trace_path: 每个提交各阶段耗时的 JSON lines 文件和 Chrome trace 文件，都为 None 时不计时。
+
+    输入按 iter_chunks 分批处理，内存只与一批的大小有关：分析当前这一批的同时在后台线程中克隆下一批用到的仓库。
+    diff 解析是 CPU 密集的正则计算，受 GIL 限制，所以用进程池而不是线程池。
+    提交按仓库分组，每组整体交给一个 worker；所有行都由当前进程通过同一个 csv.writer 写出。
+    """
+    if resume:
+        finished = load_finished_urls(output_path)
+        print(f"Resuming: {sum(finished.values())} finished")
+        commits = skip_finished(commits, finished)
+    store = ResultsStore(store_path) if store_path else None
+    if store is not None:
+        if resume:
+            # 上次崩溃时存储可能比 CSV 多出最后一批，截掉后与 CSV 对齐
+            store.truncate(count_output_rows(output_path))
+        else:
+            store.truncate(0)
+    write_header = not resume or not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+    profiler.enabled = bool(profile_path or trace_path)
+
+    with profiler.ProfileWriter(profile_path, trace_path) as profile_writer, open(output_path, 'a' if resume else 'w', newline='', encoding='utf-8') as f, \
+            ThreadPoolExecutor(max_workers=1) as cloner, \
+            (ProcessPoolExecutor(max_workers=jobs, mp_context=get_worker_context(), initializer=init_worker, initargs=(base_path1, cache_path, cache_max_bytes, clone_mode, http_client.http_cache_dir, diff_filter, profiler.enabled, sorted(languages.enabled), show_test_pairs))
+             if jobs > 1 else contextlib.nullcontext()) as executor:
+        ordered = OrderedRowWriter(f, store=store)
+        if write_header:
+            ordered.writer.writerow(output_header)
+
+        def start_clone(chunk):
+            refs = [parse_commit_url(commit.url) for commit in chunk]
+            urls = [format_commit_url(ref) if ref is not None else commit.url for ref, commit in zip(refs, chunk)]
+            return cloner.submit(clone_repositories, urls, base_path1, concurrency, max_concurrency)
+
+        def analyze_items(items):
+            """分析一批 (index, url)，按完成的顺序返回 (index, row)。"""
+            groups = group_by_repository(items)
+            if executor is not None:
+                # 大的分组先提交，避免最后只剩一个 worker 在跑大仓库
+                futures = [executor.submit(analyze_group, group) for group in sorted(groups, key=len, reverse=True)]
+                results = (future.result() for future in as_completed(futures))
+            else:
+                results = (analyze_group(group) for group in groups)
+            for rows, records in results:
+                profile_writer.write(records + profiler.drain())
+                yield from rows
+
+        index = CommitIndex(get_local_path)
+        chunks = iter_chunks(commits)
+        chunk = next(chunks, None)
+        cloning = start_clone(chunk) if chunk else None
+        start = 0
+        while chunk:
+            cloning.result()
+            next_chunk = next(chunks, None)
+            if next_chunk:
+                cloning = start_clone(next_chunk)
+            ordered.cwes.update((position, commit.cwe) for position, commit in enumerate(chunk, start))
+
+            # 同一个提交（规范化后键相同）只分析第一次出现的行，其余的行复制它的结果
+            originals = {}
+            followers = {}
+            items = []
+            for position, commit in enumerate(chunk, start):
+                canonical, key = index.normalize(commit.url)
+                cached = index.get_result(key)
+                if cached is not None:
+                    ordered.add(position, fan_out(commit.url, cached))
+                elif key is not None and key in followers:
+                    followers[key].append((position, commit.url, canonical))
+                else:
+                    followers[key] = []
+                    originals[position] = (commit.url, key)
+                    items.append((position, canonical))
+
+            retry = []
+            for position, row in analyze_items(items):
+                url, key = originals[position]
+                if row is not None:
+                    row = [url] + row[1:]
+                    index.put_result(key, row)
+                ordered.add(position, row)
+                for follower_position, follower_url, canonical in followers.get(key, []):
+                    if row is not None:
+                        ordered.add(follower_position, fan_out(follower_url, row))
+                    else:
+                        # 第一次出现的仓库可能没有克隆成功，其余的行改为各自分析
+                        originals[follower_position] = (follower_url, None)
+                        retry.append((follower_position, canonical))
+            for position, row in analyze_items(retry):
+                ordered.add(position, [originals[position][0]] + row[1:] if row is not None else None)
+            ordered.sync()
+            start += len(chunk)
+            chunk = next_chunk
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='分析 GitHub 提交的 diff')
+    arg_parser.add_argument('--input', default=input_csv, help='输入的 CSV 文件路径')
+    arg_parser.add_argument('--output', default=output_csv, help='输出的 CSV 文件路径')
+    arg_parser.add_argument('--base-path', default=base_path1, help='本地存放所有仓库的目录')
+    arg_parser.add_argument('--jobs', type=int, default=1, help='并行分析的进程数')
+    arg_parser.add_argument('--chunk-size', type=int, default=chunk_size, help='流式读取输入时每批提交数的上限')
+    arg_parser.add_argument('--cache', default=None, help='缓存文件路径，默认为 <base-path>/fw_cache.sqlite')
+    arg_parser.add_argument('--no-cache', action='store_true', help='不使用缓存')
+    arg_parser.add_argument('--cache-size', type=int, default=cache_max_bytes // 1024 ** 2, help='缓存大小上限（MB）')
+    arg_parser.add_argument('--clone-mode', choices=['full', 'blobless', 'treeless', 'mirror'], default=clone_mode,
+                            help='full 完整克隆；blobless / treeless 只获取输入中的提交及其父提交；mirror 共享对象的裸镜像')
+    arg_parser.add_argument('--clone-concurrency', type=int, default=4, help='克隆的初始并发数')
+    arg_parser.add_argument('--max-clone-concurrency', type=int, default=16, help='克隆的最大并发数')
+    arg_parser.add_argument('--remote-base', default=remote_base, help='远程仓库地址前缀，默认使用 GitHub')
+    arg_parser.add_argument('--languages', default='java',
+                            help=f"参与统计的语言，逗号分隔，可选 {','.join(languages.get_names())}；java_file 列为这些语言的文件数")
+    arg_parser.add_argument('--pathspec-filter', action='store_true',
+                            help='先用 --name-status 统计文件，只取启用语言（--languages）的源文件的 diff')
+    arg_parser.add_argument('--test-pairs', action='store_true', help='打印每个修改的源文件对应的测试文件')
+    arg_parser.add_argument('--http-cache', default=None, help='下载 .diff 时使用的 HTTP 缓存目录（ETag/Last-Modified 条件请求）')
+    arg_parser.add_argument('--store', default=None, help='同时把结果写入这个目录下的列式存储（见 results_store.py）')
+    arg_parser.add_argument('--profile', default=None, help='把每个提交各阶段的耗时写入这个 JSON lines 文件，用 python profiler.py 汇总')
+    arg_parser.add_argument('--trace', default=None, help='把各阶段写成 Chrome trace 文件（chrome://tracing 或 Perfetto 打开）')
+    arg_parser.add_argument('--resume', action='store_true', help='保留已有的输出，跳过已经完成的 URL')
+    arg_parser.add_argument('--since', default=None, help='只分析这个 CSV 中的新增行（格式与输入相同），结果追加到已有的输出')
+    args = arg_parser.parse_args()
+    input_csv, output_csv, base_path1 = args.input, args.output, args.base_path
+    clone_mode, remote_base, chunk_size = args.clone_mode, args.remote_base, args.chunk_size
+    http_client.http_cache_dir = args.http_cache
+    diff_filter = args.pathspec_filter
+    show_test_pairs = args.test_pairs
+    unknown = languages.set_enabled([name.strip() for name in args.languages.split(',') if name.strip()])
+    if unknown:
+        print(f"Unknown languages ignored: {', '.join(unknown)}")
+    if not args.no_cache:
+        cache_path = args.cache or os.path.join(base_path1, 'fw_cache.sqlite')
+        cache_max_bytes = args.cache_size * 1024 ** 2
+        get_diff_cache().prune(parser_version)
+        get_diff_cache().evict()
+
+    # 逐行读取输入的 CSV 文件（按表头识别格式，跳过重复的提交 URL），边克隆边分析
+    # 同一个提交可能在不同的 CWE 下出现多次（例如 Script2.py 的输出），每一行都保留，由 CommitIndex 只分析一次
+    commits = read_commits(args.since or input_csv, dedup=False)
+    run_analysis(commits, output_csv, args.jobs, resume=args.resume or args.since is not None, store_path=args.store,
+                 concurrency=args.clone_concurrency, max_concurrency=args.max_clone_concurrency,
+                 profile_path=args.profile, trace_path=args.trace)
+    if args.profile:
+        profiler.summarize(profiler.load_records(args.profile))
@@ -1,7 +1,10 @@
 #处理veracode_fliter.csv文件，提取cve_id，然后请求nvd的api，获取cwe，然后写入out.csv文件
-import requests
 import csv
 from urllib.parse import urlparse
+from nvd_store import NvdStore
+from input_reader import read_commits
+
+nvd_feeds=[]    #先导入 NvdStore 的本地 NVD JSON 文件（API 2.0 格式，可以是 .gz），为空时第一次运行下载全部记录
 
 def open_out_file():  #打开输出文件 最后要记得销毁，关闭文件
     out_file=open(r"./out.csv",mode="w")
@@ -12,21 +15,6 @@ def open_outjson_file():
     outjson_file=open(r"./out.json",mode="w")
     return outjson_file
 
-class CSVReader:     #csv迭代器
-    def __init__(self, filename):
-        self.file = open(filename, 'r')
-        self.reader = csv.reader(self.file)
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        try:
-            return next(self.reader)
-        except StopIteration:
-            self.file.close()
-            raise StopIteration
-
 def find_cwe_from_json(data):   #这个还需要改进
     try:
         vulnerabilities = data['vulnerabilities']
@@ -43,21 +31,19 @@ def find_cwe_from_json(data):   #这个还需要改进
 index=1
 out_file=open_out_file()
 outjson_file=open_outjson_file()
-url_prefix="https://services.nvd.nist.gov/rest/json/cves/2.0?cveId="
-csv_reader = CSVReader('../veracode_fliter.csv')
-for row in csv_reader:
-    cve_id=row[0]
-    url=row[3]
+rows=list(read_commits('../veracode_fliter.csv', dedup=False))    #按内容找出每行的 CVE 和提交 URL，不依赖列号
+store=NvdStore('nvd_cache.sqlite')    #本地的 NVD 记录库
+store.sync(nvd_feeds)    #先导入本地文件，再批量下载上次同步之后修改过的记录
+store.resolve([row.cve for row in rows])    #库中仍然没有的 CVE 再单独请求
+for row in rows:
+    cve_id=row.cve
+    url=row.url
     parsed_uri = urlparse(url)
     path_fileds=parsed_uri.path.split('/')
     repo=path_fileds[1]+"/"+path_fileds[2]    #那么这里的repo就是项目名
-    full_url=url_prefix+cve_id    #这是用来请求nvd的api的url
-    response=requests.get(full_url)
-    if response.status_code==200:
-        #返回成功
-        json_data=response.json()
-    else:
-        print(f"Request {cve_id} failed with status code: {response.status_code}")
+    json_data=store.get_response(cve_id)    #从本地库中查询，格式与nvd的api返回的一致
+    if json_data is None:
+        print(f"{cve_id} not found in NVD")
         continue
     cwe=find_cwe_from_json(json_data)
     if not cwe:
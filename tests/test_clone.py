@@ -0,0 +1,156 @@
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rs
+import mirror_store
+
+def git(*args, cwd=None):
+    return subprocess.run(['git'] + list(args), cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+class PlanCloneTest(unittest.TestCase):
+    """
+    用 file:// 地址的本地裸仓库测试 plan_clone 的部分克隆和镜像命令。
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
+        work = os.path.join(cls.root, 'work')
+        os.makedirs(work)
+        git('init', '-q', '-b', 'main', cwd=work)
+        git('config', 'user.email', 'dev@example.org', cwd=work)
+        git('config', 'user.name', 'dev', cwd=work)
+        cls.commits = []
+        for number in range(5):
+            with open(os.path.join(work, 'Foo.java'), 'a', encoding='utf-8') as f:
+                f.write(f'class Foo{number} {{}}\n')
+            git('add', 'Foo.java', cwd=work)
+            git('commit', '-q', '-m', f'change {number}', cwd=work)
+            cls.commits.append(git('rev-parse', 'HEAD', cwd=work))
+        remote = os.path.join(cls.root, 'remote', 'own', 'repo')
+        git('clone', '-q', '--bare', work, remote)
+        git('config', 'uploadpack.allowFilter', 'true', cwd=remote)
+        git('config', 'uploadpack.allowAnySHA1InWant', 'true', cwd=remote)
+        cls.remote = remote
+        cls.url = f'https://github.com/own/repo/commit/{cls.commits[-1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root)
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.saved = rs.remote_base, rs.base_path1
+        rs.remote_base = 'file://' + os.path.join(self.root, 'remote')
+        rs.base_path1 = self.output_dir
+        rs.fetched_branches.clear()
+        mirror_store.fetched_branches.clear()
+
+    def tearDown(self):
+        rs.remote_base, rs.base_path1 = self.saved
+        shutil.rmtree(self.output_dir)
+
+    def run_plan(self, mode, commits):
+        """执行 plan_clone 直到返回空列表，返回每一轮的命令。"""
+        rounds = []
+        for _ in range(4):
+            commands = rs.plan_clone(self.url, self.output_dir, mode, commits)
+            if not commands:
+                return rounds
+            rounds.append(commands)
+            for command in commands:
+                subprocess.run(command, check=True, capture_output=True)
+        self.fail(f'plan_clone still returns commands after {len(rounds)} rounds')
+
+    def get_fetch(self, rounds):
+        return [command for commands in rounds for command in commands if 'fetch' in command]
+
+    def assert_local_commit(self, path, rev):
+        """不经过按需下载确认提交在本地：先把远程移开，再查询对象。"""
+        moved = self.remote + '.moved'
+        os.rename(self.remote, moved)
+        try:
+            result = subprocess.run(['git', '-C', path, 'cat-file', '-e', f'{rev}^{{commit}}'], capture_output=True)
+        finally:
+            os.rename(moved, self.remote)
+        self.assertEqual(result.returncode, 0, f'{rev} is not in {path}')
+
+    def check_partial(self, mode, partial_filter):
+        commit, parent = self.commits[3], self.commits[2]
+        rounds = self.run_plan(mode, [commit])
+        fetches = self.get_fetch(rounds)
+        self.assertEqual(len(fetches), 1)
+        self.assertIn('--depth=2', fetches[0])
+        self.assertIn(f'--filter={partial_filter}', fetches[0])
+        self.assertEqual(fetches[0][-1], f'{commit}:refs/fw/{commit}')
+
+        path = os.path.join(self.output_dir, 'repo')
+        self.assertEqual(git('config', 'remote.origin.partialclonefilter', cwd=path), partial_filter)
+        self.assertEqual(git('rev-parse', f'refs/fw/{commit}', cwd=path), commit)
+        # --depth=2 同时取得父提交，git diff <hash>^..<hash> 可以直接运行
+        self.assert_local_commit(path, parent)
+        self.assertEqual(git('rev-parse', '--is-shallow-repository', cwd=path), 'true')
+
+        # 已经获取的提交不再 fetch
+        self.assertEqual(rs.plan_clone(self.url, self.output_dir, mode, [commit]), [])
+
+    def test_blobless(self):
+        self.check_partial('blobless', 'blob:none')
+
+    def test_treeless(self):
+        self.check_partial('treeless', 'tree:0')
+
+    def test_short_sha(self):
+        short = self.commits[1][:8]
+        rounds = self.run_plan('blobless', [self.commits[4], short])
+        fetches = self.get_fetch(rounds)
+        # 短哈希不出现在 refspec 中，先获取所有分支，再记到 refs/fw/<短哈希>
+        self.assertTrue(all(f'{short}:refs/fw/{short}' not in fetch for fetch in fetches))
+        self.assertIn('+refs/heads/*:refs/fw-branches/*', fetches[0])
+        self.assertEqual(fetches[1][-1], f'{self.commits[4]}:refs/fw/{self.commits[4]}')
+        self.assertNotIn('--depth=2', fetches[1])
+        path = os.path.join(self.output_dir, 'repo')
+        self.assertEqual(git('rev-parse', f'refs/fw/{short}', cwd=path), self.commits[1])
+        self.assert_local_commit(path, self.commits[0])
+
+    def test_short_sha_in_shallow_repository(self):
+        self.run_plan('treeless', [self.commits[4]])
+        short = self.commits[0][:8]
+        rounds = self.run_plan('treeless', [short])
+        fetches = self.get_fetch(rounds)
+        self.assertIn('--unshallow', fetches[0])
+        path = os.path.join(self.output_dir, 'repo')
+        self.assertEqual(git('rev-parse', f'refs/fw/{short}', cwd=path), self.commits[0])
+
+    def test_unknown_short_sha(self):
+        rounds = self.run_plan('blobless', [self.commits[4], 'deadbeef'])
+        # 所有分支只获取一次，找不到的短哈希跳过，不影响其他提交
+        self.assertEqual(sum('+refs/heads/*:refs/fw-branches/*' in fetch for fetch in self.get_fetch(rounds)), 1)
+        path = os.path.join(self.output_dir, 'repo')
+        self.assertEqual(git('rev-parse', f'refs/fw/{self.commits[4]}', cwd=path), self.commits[4])
+
+    def test_full(self):
+        rounds = self.run_plan('full', None)
+        self.assertEqual(rounds[0][0][3], 'clone')
+        self.assertEqual(git('rev-parse', 'HEAD', cwd=os.path.join(self.output_dir, 'repo')), self.commits[-1])
+
+    def test_mirror_short_sha(self):
+        short = self.commits[2][:8]
+        rounds = self.run_plan('mirror', [self.commits[4], short])
+        self.assertEqual(rounds[0][0][1], 'clone')
+        path = mirror_store.get_mirror_path(self.output_dir, 'own/repo')
+        self.assertEqual(mirror_store.missing_commits(path, [self.commits[4], short]), [])
+
+    def test_broken_mirror(self):
+        path = mirror_store.get_mirror_path(self.output_dir, 'own/repo')
+        os.makedirs(path)
+        self.assertEqual(mirror_store.missing_commits(path, [self.commits[4]]), [self.commits[4]])
+
+if __name__ == '__main__':
+    unittest.main()
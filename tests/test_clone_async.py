@@ -0,0 +1,167 @@
+import os
+import sys
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clone_async
+from clone_async import AdaptiveLimit, CloneOrchestrator, summarize_error
+
+class ScriptedOrchestrator(CloneOrchestrator):
+    """
+    不启动 git 的调度器：命令的结果由 outcomes 按顺序给出，记录执行过的命令和同时执行的最大数量。
+    """
+
+    def __init__(self, outcomes=(), delay=0.0, **kwargs):
+        kwargs.setdefault('backoff_base', 0.001)
+        super().__init__(**kwargs)
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.commands = []
+        self.active = 0
+        self.max_active = 0
+        self.succeeded = 0
+
+    async def run_command(self, command):
+        self.commands.append(command)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        outcome = self.outcomes.pop(0) if self.outcomes else (0, '')
+        if outcome[0] == 0:
+            self.succeeded += 1
+        return outcome
+
+def once(name):
+    """第一次返回一条命令，之后返回空列表的 plan（命令成功后仓库就完整了）。"""
+    state = {'done': False}
+
+    def plan():
+        if state['done']:
+            return []
+        state['done'] = True
+        return [['git', 'clone', name]]
+    return plan
+
+def always(name):
+    """每次都返回一条命令的 plan，失败后重试时也会重新执行。"""
+    return lambda: [['git', 'fetch', name]]
+
+class CloneOrchestratorTest(unittest.TestCase):
+
+    def test_success(self):
+        orchestrator = ScriptedOrchestrator()
+        results = asyncio.run(orchestrator.run([[('a', once('a'))], [('b', once('b'))]]))
+        self.assertEqual(results, {'a': True, 'b': True})
+        self.assertEqual(len(orchestrator.commands), 2)
+
+    def test_retry_then_success(self):
+        orchestrator = ScriptedOrchestrator([(128, 'fatal: unable to access: Connection reset')])
+        results = asyncio.run(orchestrator.run([[('a', until_success(orchestrator))]]))
+        self.assertEqual(results, {'a': True})
+        self.assertEqual(len(orchestrator.commands), 2)
+
+    def test_permanent_error_not_retried(self):
+        orchestrator = ScriptedOrchestrator([(128, "fatal: repository 'x' not found")])
+        results = asyncio.run(orchestrator.run([[('a', always('a'))]]))
+        self.assertEqual(results, {'a': False})
+        self.assertEqual(len(orchestrator.commands), 1)
+
+    def test_max_retries(self):
+        orchestrator = ScriptedOrchestrator([(1, 'error: timeout')] * 10, max_retries=2, retry_budget=10)
+        results = asyncio.run(orchestrator.run([[('a', always('a'))]]))
+        self.assertEqual(results, {'a': False})
+        self.assertEqual(len(orchestrator.commands), 3)
+
+    def test_retry_budget(self):
+        orchestrator = ScriptedOrchestrator([(1, 'error: timeout')] * 20, max_retries=5, retry_budget=1)
+        results = asyncio.run(orchestrator.run([[('a', always('a')), ('b', always('b'))]]))
+        self.assertEqual(results, {'a': False, 'b': False})
+        # 两个任务各执行一次，合计只重试一次
+        self.assertEqual(len(orchestrator.commands), 3)
+
+    def test_backoff(self):
+        orchestrator = ScriptedOrchestrator([(1, 'error: timeout')] * 3, max_retries=2, retry_budget=10,
+                                            backoff_base=0.05, backoff_max=0.08)
+        loop_time = asyncio.run(timed(orchestrator.run([[('a', always('a'))]])))
+        # 两次重试前分别等待 [0.025, 0.05] 和 [0.04, 0.08] 秒（上限 backoff_max，带抖动）
+        self.assertGreaterEqual(loop_time, 0.06)
+        self.assertLess(loop_time, 1.0)
+
+    def test_plan_still_pending_fails(self):
+        orchestrator = ScriptedOrchestrator(max_retries=1)
+        results = asyncio.run(orchestrator.run([[('a', always('a'))]]))
+        self.assertEqual(results, {'a': False})
+        # 每次尝试执行 max_plan_rounds 轮，之后 plan 仍不为空
+        self.assertEqual(len(orchestrator.commands), 2 * clone_async.max_plan_rounds)
+
+    def test_execute_reports_pending_plan(self):
+        error = asyncio.run(ScriptedOrchestrator().execute(always('a')))
+        self.assertIn('still incomplete', error)
+
+    def test_concurrency_limit(self):
+        orchestrator = ScriptedOrchestrator(delay=0.02, concurrency=2, max_concurrency=2)
+        groups = [[(str(number), once(str(number)))] for number in range(8)]
+        results = asyncio.run(orchestrator.run(groups))
+        self.assertTrue(all(results.values()))
+        self.assertEqual(orchestrator.max_active, 2)
+
+    def test_throttle_halves_concurrency(self):
+        orchestrator = ScriptedOrchestrator([(128, 'remote: HTTP 429 Too Many Requests')], concurrency=8, max_concurrency=8)
+        asyncio.run(orchestrator.run([[('a', until_success(orchestrator))]]))
+        self.assertEqual(orchestrator.limit.limit, 4)
+
+    def test_run_command(self):
+        returncode, stderr = asyncio.run(CloneOrchestrator().run_command(
+            [sys.executable, '-c', 'import sys; sys.stderr.write("fatal: boom"); sys.exit(3)']))
+        self.assertEqual(returncode, 3)
+        self.assertEqual(summarize_error(stderr), 'fatal: boom')
+
+def until_success(orchestrator):
+    """orchestrator 中有命令成功之前每次都返回一条命令，成功后返回空列表。"""
+    return lambda: [] if orchestrator.succeeded else [['git', 'fetch']]
+
+async def timed(coroutine):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await coroutine
+    return loop.time() - start
+
+class AdaptiveLimitTest(unittest.TestCase):
+
+    def test_increase_and_decrease(self):
+        async def scenario():
+            limit = AdaptiveLimit(initial=4, maximum=6, window=2)
+            for _ in range(2):
+                await limit.record_success()
+            self.assertEqual(limit.limit, 5)  # 第一个窗口没有比较对象，加一
+            limit.last_rate = 1e12
+            for _ in range(2):
+                await limit.record_success()
+            self.assertEqual(limit.limit, 4)  # 吞吐量明显下降，减一
+            for _ in range(3):
+                limit.last_rate = 1e-6
+                for _ in range(2):
+                    await limit.record_success()
+            self.assertEqual(limit.limit, 6)  # 吞吐量提高，每个窗口加一，不超过 maximum
+        asyncio.run(scenario())
+
+    def test_failures(self):
+        async def scenario():
+            limit = AdaptiveLimit(initial=9, maximum=16)
+            await limit.record_failure(throttled=False)
+            self.assertEqual(limit.limit, 8)
+            await limit.record_failure(throttled=True)
+            self.assertEqual(limit.limit, 4)
+            for _ in range(5):
+                await limit.record_failure(throttled=True)
+            self.assertEqual(limit.limit, 1)
+            self.assertIsNone(limit.last_rate)
+        asyncio.run(scenario())
+
+if __name__ == '__main__':
+    unittest.main()
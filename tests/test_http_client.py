@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import HttpClient, TokenBucket, parse_retry_after
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    本地的替身服务。server.responses 为路径到响应列表的字典，每次请求按顺序取出一个 (状态码, 响应头, 内容)，
+    只剩一个时一直返回它；收到的请求头记在 server.requests 中。
+    """
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        responses = self.server.responses[self.path]
+        status, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class HttpClientTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+        cls.server.responses = {}
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.host = f'127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.responses.clear()
+        self.server.requests.clear()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_client(self, cache=False):
+        client = HttpClient(self.directory if cache else None, max_attempts=3)
+        client.set_rate(self.host, 1000, 1000)
+        return client
+
+    def url(self, path):
+        return f'http://{self.host}{path}'
+
+    def test_revalidation(self):
+        self.server.responses['/diff'] = [(200, {'ETag': '"v1"'}, b'first'), (304, {'ETag': '"v1"'}, b'')]
+        client = self.get_client(cache=True)
+        response = client.get(self.url('/diff'))
+        self.assertEqual(response.content, b'first')
+        self.assertFalse(response.from_cache)
+        response = client.get(self.url('/diff'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'first')
+        self.assertTrue(response.from_cache)
+        self.assertEqual(self.server.requests[1][1].get('If-None-Match'), '"v1"')
+
+    def test_no_cache_without_validator(self):
+        self.server.responses['/plain'] = [(200, {}, b'body')]
+        client = self.get_client(cache=True)
+        client.get(self.url('/plain'))
+        client.get(self.url('/plain'))
+        self.assertNotIn('If-None-Match', self.server.requests[1][1])
+        self.assertNotIn('If-Modified-Since', self.server.requests[1][1])
+
+    def test_retry_after(self):
+        self.server.responses['/limited'] = [(429, {'Retry-After': '1'}, b''), (200, {}, b'ok')]
+        start = time.monotonic()
+        response = self.get_client().get(self.url('/limited'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+
+    def test_throttle_without_hint(self):
+        for status in (429, 503):
+            self.server.requests.clear()
+            self.server.responses['/busy'] = [(status, {}, b''), (200, {}, b'ok')]
+            start = time.monotonic()
+            response = self.get_client().get(self.url('/busy'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(self.server.requests), 2)
+            # 第一次重试前按 2 ** 0 秒退避
+            self.assertGreaterEqual(time.monotonic() - start, 0.9)
+
+    def test_forbidden_not_retried(self):
+        self.server.responses['/private'] = [(403, {}, b'')]
+        response = self.get_client().get(self.url('/private'))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        self.server.responses['/down'] = [(503, {'Retry-After': '0'}, b'')]
+        response = self.get_client().get(self.url('/down'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertIsNone(parse_retry_after(''))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_rate(self):
+        bucket = TokenBucket(20, 2)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # 突发的 2 个立即通过，其余 4 个按每秒 20 个恢复
+        elapsed = time.monotonic() - start
+        self.assertGreaterEqual(elapsed, 0.18)
+        self.assertLess(elapsed, 1.0)
+
+    def test_observe_remaining(self):
+        bucket = TokenBucket(1000, 10)
+        bucket.observe(5, 10)
+        self.assertAlmostEqual(bucket.rate, 0.5)
+        self.assertLessEqual(bucket.tokens, 5)
+
+    def test_pause(self):
+        bucket = TokenBucket(1000, 10)
+        bucket.observe(0, 0.3)
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+if __name__ == '__main__':
+    unittest.main()
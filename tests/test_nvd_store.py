@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import gzip
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nvd_store
+from nvd_store import NvdStore, parse_nvd_time
+from http_client import HttpClient
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+class NvdStandIn(BaseHTTPRequestHandler):
+    """
+    本地的 NVD API 替身，按 cveId、lastModStartDate/lastModEndDate 和 startIndex/resultsPerPage
+    从 fixtures/nvd_api.json 中返回记录，收到的查询参数记在 server.requests 中。
+    """
+
+    def do_GET(self):
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        self.server.requests.append(params)
+        items = self.server.items
+        if 'cveId' in params:
+            items = [item for item in items if item['cve']['id'] == params['cveId']]
+        if 'lastModStartDate' in params:
+            start, end = parse_nvd_time(params['lastModStartDate']), parse_nvd_time(params['lastModEndDate'])
+            items = [item for item in items if start <= parse_nvd_time(item['cve']['lastModified']) <= end]
+        start_index = int(params.get('startIndex', 0))
+        per_page = int(params.get('resultsPerPage', 2000))
+        page = items[start_index:start_index + per_page]
+        body = json.dumps({'resultsPerPage': len(page), 'startIndex': start_index, 'totalResults': len(items),
+                           'format': 'NVD_CVE', 'version': '2.0', 'vulnerabilities': page}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def load_fixture(name):
+    with open(os.path.join(fixtures, name), encoding='utf-8') as f:
+        return json.load(f)
+
+def get_cwe(response):
+    return response['vulnerabilities'][0]['cve']['weaknesses'][0]['description'][0]['value']
+
+class NvdStoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), NvdStandIn)
+        cls.server.items = load_fixture('nvd_api.json')['vulnerabilities']
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.host = f'127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.directory = tempfile.mkdtemp()
+        client = HttpClient()
+        client.set_rate(self.host, 1000, 1000)
+        self.store = NvdStore(os.path.join(self.directory, 'nvd.sqlite'), f'http://{self.host}/rest/json/cves/2.0',
+                              client=client)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def cve_requests(self):
+        return [params['cveId'] for params in self.server.requests if 'cveId' in params]
+
+    def test_load_feed(self):
+        self.assertEqual(self.store.load_feed(os.path.join(fixtures, 'nvd_feed.json')), 2)
+        self.assertEqual(self.store.get_meta('last_sync'), '2024-03-01T00:00:00.000+00:00')
+        response = self.store.get_response('CVE-2023-0002')
+        self.assertEqual(response['totalResults'], 1)
+        self.assertEqual(get_cwe(response), 'CWE-89')
+        self.assertIsNone(self.store.get_response('CVE-2023-0003'))
+        self.assertEqual(self.server.requests, [])
+
+    def test_load_gzip_feed(self):
+        path = os.path.join(self.directory, 'nvd_feed.json.gz')
+        with open(os.path.join(fixtures, 'nvd_feed.json'), 'rb') as src, gzip.open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        self.assertEqual(self.store.load_feed(path), 2)
+        # 同一个文件再导入一次，没有需要更新的记录
+        self.assertEqual(self.store.load_feed(path), 0)
+
+    def test_full_download_pages(self):
+        original = nvd_store.results_per_page
+        nvd_store.results_per_page = 2
+        try:
+            self.assertEqual(self.store.sync(), 5)
+        finally:
+            nvd_store.results_per_page = original
+        self.assertEqual([params['startIndex'] for params in self.server.requests], ['0', '2', '4'])
+        self.assertTrue(all('lastModStartDate' not in params for params in self.server.requests))
+        self.assertIsNotNone(self.store.get_meta('last_sync'))
+
+        # 第二次只查询上次同步之后的时间段
+        self.server.requests.clear()
+        self.assertEqual(self.store.sync(), 0)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIn('lastModStartDate', self.server.requests[0])
+
+    def test_sync_after_feed_downloads_changes_only(self):
+        changed = self.store.sync([os.path.join(fixtures, 'nvd_feed.json')])
+        # 文件生成之后修改的 CVE-2023-0001 被更新，新增 CVE-2024-0004 和 CVE-2024-0005
+        self.assertEqual(changed, 3)
+        self.assertTrue(all('lastModStartDate' in params for params in self.server.requests))
+        self.assertEqual(self.server.requests[0]['lastModStartDate'], '2024-03-01T00:00:00.000+00:00')
+        for params in self.server.requests:
+            days = (parse_nvd_time(params['lastModEndDate']) - parse_nvd_time(params['lastModStartDate'])).days
+            self.assertLessEqual(days, nvd_store.max_range_days)
+        self.assertEqual(get_cwe(self.store.get_response('CVE-2023-0001')), 'CWE-80')
+
+        # 批量同步后只有没有同步到的 CVE 单独请求
+        self.server.requests.clear()
+        not_found = self.store.resolve(['CVE-2023-0001', 'CVE-2024-0004', 'CVE-2023-0003', 'CVE-2099-9999'])
+        self.assertEqual(self.cve_requests(), ['CVE-2023-0003', 'CVE-2099-9999'])
+        self.assertEqual(not_found, ['CVE-2099-9999'])
+        self.assertEqual(get_cwe(self.store.get_response('CVE-2023-0003')), 'CWE-22')
+
+    def test_older_feed_does_not_overwrite(self):
+        self.store.sync()
+        last_sync = self.store.get_meta('last_sync')
+        self.assertEqual(self.store.load_feed(os.path.join(fixtures, 'nvd_feed.json')), 0)
+        self.assertEqual(get_cwe(self.store.get_response('CVE-2023-0001')), 'CWE-80')
+        # 同步时间退回到文件的生成时间，不会漏掉文件之后的修改
+        self.assertEqual(self.store.get_meta('last_sync'), '2024-03-01T00:00:00.000+00:00')
+        self.assertLess(parse_nvd_time(self.store.get_meta('last_sync')), parse_nvd_time(last_sync))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+# 测试文件的命名方式，{stem} 为源文件去掉扩展名后的文件名
+test_name_formats = ['{stem}Test{ext}', 'Test{stem}{ext}', '{stem}Tests{ext}', '{stem}IT{ext}']
+
+def is_test_name(name):
+    """文件名或目录名中含有 test（不区分大小写）时认为是测试，与 diff 中判断测试文件的规则一致。"""
+    return 'test' in name.lower()
+
+class LruCache:
+    """按条目数限制大小的 LRU 缓存，多个线程可以共用。"""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+# (子树哈希, 是否位于测试目录下) -> 子树中测试文件的相对路径
+# 相邻提交的大部分子树没有变化，只需要读取改变了的子树
+subtree_cache = LruCache(65536)
+
+# 根树哈希 -> TreeIndex，树相同的提交（例如 merge 或 revert 后）共用一个索引
+tree_index_cache = LruCache(256)
+
+def list_test_paths(cat, tree_sha, in_test_dir=False):
+    """
+    列出子树中的测试文件。
+
+    参数:
+    - cat: 仓库的 git_batch.CatFile。
+    - tree_sha: 子树哈希。
+    - in_test_dir: 子树是否位于名字含有 test 的目录下，是时其中的所有文件都是测试文件。
+
+    返回:
+    - 测试文件相对于子树的路径元组。
+    """
+    key = (tree_sha, in_test_dir)
+    paths = subtree_cache.get(key)
+    if paths is not None:
+        return paths
+    found = []
+    for mode, kind, sha, name in cat.read_tree(tree_sha, recursive=False):
+        if kind == 'tree':
+            found.extend(f'{name}/{path}' for path in list_test_paths(cat, sha, in_test_dir or is_test_name(name)))
+        elif kind == 'blob' and (in_test_dir or is_test_name(name)):
+            found.append(name)
+    paths = tuple(found)
+    subtree_cache.put(key, paths)
+    return paths
+
+class TreeIndex:
+    """
+    一个提交中测试文件的索引。
+
+    测试文件的路径排序后保存，按目录前缀的查询通过二分查找完成；
+    另外按文件名建立字典，用于找到与源文件对应的测试文件。
+    """
+
+    def __init__(self, test_paths):
+        """
+        参数:
+        - test_paths: 测试文件的完整路径。
+        """
+        self.test_paths = sorted(test_paths)
+        self.by_name = {}
+        for path in self.test_paths:
+            self.by_name.setdefault(path.rsplit('/', 1)[-1], []).append(path)
+
+    def has_tests(self, prefix=''):
+        """
+        判断目录（模块）下是否有测试文件。
+
+        参数:
+        - prefix: 目录前缀，例如 "core/"，为空时检查整个仓库。
+        """
+        i = bisect.bisect_left(self.test_paths, prefix)
+        return i < len(self.test_paths) and self.test_paths[i].startswith(prefix)
+
+    def tests_under(self, prefix=''):
+        """返回目录下的所有测试文件。"""
+        start = bisect.bisect_left(self.test_paths, prefix)
+        end = bisect.bisect_left(self.test_paths, prefix + '\U0010ffff')
+        return self.test_paths[start:end]
+
+    def pair_tests(self, source_path):
+        """
+        找到与源文件对应的测试文件，例如 src/main/java/a/Foo.java 对应 src/test/java/a/FooTest.java。
+
+        返回:
+        - 测试文件路径列表，与源文件的公共目录越长越靠前。
+        """
+        name = source_path.rsplit('/', 1)[-1]
+        stem, dot, ext = name.rpartition('.')
+        if not dot:
+            stem, ext = name, ''
+        ext = dot + ext
+        found = []
+        for name_format in test_name_formats:
+            found.extend(self.by_name.get(name_format.format(stem=stem, ext=ext), []))
+
+        def common_prefix(path):
+            length = 0
+            for a, b in zip(path.split('/'), source_path.split('/')):
+                if a != b:
+                    break
+                length += 1
+            return length
+
+        return sorted(found, key=lambda path: (-common_prefix(path), path))
+
+def get_tree_index(cat, rev):
+    """
+    返回提交的测试文件索引。
+
+    参数:
+    - cat: 仓库的 git_batch.CatFile。
+    - rev: 提交哈希。
+
+    返回:
+    - TreeIndex，提交不存在时返回 None。
+    """
+    commit = cat.read_commit(rev)
+    if commit is None or commit['tree'] is None:
+        return None
+    index = tree_index_cache.get(commit['tree'])
+    if index is None:
+        index = TreeIndex(list_test_paths(cat, commit['tree']))
+        tree_index_cache.put(commit['tree'], index)
+    return index